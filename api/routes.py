@@ -1,12 +1,24 @@
 # api/routes.py
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 from typing import Optional, Literal
 from datetime import datetime
 
-from core.orchestrator import handle_event, grade_answer
-from core.state import reset_state
+from core.orchestrator import handle_event, grade_answer, decision_cache_stats
+from core.state import reset_state, hold, release, flush_held, is_dirty, state_key
 from core.audit import log_event, audit_path
+from core.analytics import mastery_report
+from core.export import export as export_rows
+from core.grading import grade_text
+from core.loaders import registry as domain_registry, UnknownDomain
+from core.settings import WS_PERSIST_DEBOUNCE_MS
+from core.tracing import span, current_span, tracing_stats
+from core.llm_gemini import admission_stats, prompt_cache_stats
 
 router = APIRouter()
 
@@ -17,6 +29,7 @@ class IngestEvent(BaseModel):
     action: Optional[Literal["start", "continue", "content_only", "answer"]] = None
     question_id: Optional[str] = None
     answer: Optional[str] = None
+    domain: Optional[str] = None   # curriculum bundle under data/<domain>/; default DEFAULT_DOMAIN
 
 class ApiResponse(BaseModel):
     server_time: str
@@ -33,20 +46,38 @@ class ApiResponse(BaseModel):
 def health():
     return {"status": "ok", "service": "xai-tutor-poc"}
 
+@router.get("/metrics")
+def metrics():
+    return {
+        "llm_admission": admission_stats(),
+        "prompt_cache": prompt_cache_stats(),
+        "decision_cache": decision_cache_stats(),
+        "domains": domain_registry.stats(),
+        "tracing": tracing_stats(),
+    }
+
+@router.get("/analytics/mastery")
+def analytics_mastery():
+    return mastery_report()
+
 @router.post("/session/ingest", response_model=ApiResponse)
 def ingest(event: IngestEvent):
+    return _ingest(event)
+
+def _ingest(event: IngestEvent) -> ApiResponse:
+    current_span().set(session_id=event.session_id, action=event.action or "", domain=event.domain or "")
     # Grade if needed
     log_event(event.session_id, "ingest", event.model_dump())
     graded = None
     if event.action == "answer":
         if not event.question_id:
             raise HTTPException(status_code=400, detail="question_id required when action=answer")
-        graded = grade_answer(event.session_id, event.question_id, event.answer or "")
+        graded = grade_answer(event.session_id, event.question_id, event.answer or "", event.domain)
         log_event(event.session_id, "graded", graded)
         if "error" in graded:
             raise HTTPException(status_code=400, detail=graded["error"])
 
-    result = handle_event(event.session_id, event.message, event.action)
+    result = handle_event(event.session_id, event.message, event.action, event.domain)
 
     log_event(event.session_id, "decision", result)
 
@@ -61,11 +92,56 @@ def ingest(event: IngestEvent):
         graded=graded
     )
 
+@router.websocket("/session/ws")
+async def session_ws(ws: WebSocket, session_id: str, domain: Optional[str] = None):
+    """
+    One learner session per connection. Each text frame is an IngestEvent
+    (session_id/domain default to the query params); each reply is
+    {"type": "response", ...ApiResponse} or {"type": "error", "status", "detail"}.
+    The session stays held in memory and is persisted WS_PERSIST_DEBOUNCE_MS
+    after its last change, and on disconnect.
+    """
+    await ws.accept()
+    key = state_key(session_id, domain)   # frames for another domain go through the store
+    await run_in_threadpool(hold, key)
+    debounce = WS_PERSIST_DEBOUNCE_MS / 1000
+    try:
+        while True:
+            try:
+                text = await asyncio.wait_for(ws.receive_text(), debounce if is_dirty(key) else None)
+            except asyncio.TimeoutError:
+                flush_held(key)   # only queues the write
+                continue
+            try:
+                frame = json.loads(text)
+                if not isinstance(frame, dict):
+                    raise ValueError("frame must be a JSON object")
+                event = IngestEvent.model_validate({"session_id": session_id, "domain": domain, **frame})
+                if event.session_id != session_id:
+                    raise HTTPException(status_code=400, detail="session_id does not match this connection")
+                with span("WS /session/ws", kind="server"):
+                    resp = await run_in_threadpool(_ingest, event)
+            except ValidationError as e:
+                await ws.send_json({"type": "error", "status": 422, "detail": json.loads(e.json(include_url=False))})
+            except ValueError as e:
+                await ws.send_json({"type": "error", "status": 400, "detail": str(e)})
+            except HTTPException as e:
+                await ws.send_json({"type": "error", "status": e.status_code, "detail": e.detail})
+            except UnknownDomain as e:
+                await ws.send_json({"type": "error", "status": 404, "detail": f"unknown domain {e.args[0]!r}"})
+            else:
+                await ws.send_json({"type": "response", **resp.model_dump()})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # no await here: the task may already be cancelled when the peer goes away
+        release(key)
+
 @router.post("/session/next", response_model=ApiResponse)
-def session_next(session_id: str):
+def session_next(session_id: str, domain: Optional[str] = None):
     log_event(session_id, "ingest", {"action": "continue"})
     """Shortcut for action='continue' without sending a message."""
-    result = handle_event(session_id, user_message=None, action="continue")
+    result = handle_event(session_id, user_message=None, action="continue", domain=domain)
     log_event(session_id, "decision", result)
     return ApiResponse(
         server_time=_now(),
@@ -78,12 +154,47 @@ def session_next(session_id: str):
         graded=None
     )
 
+@router.post("/grade/bulk")
+async def grade_bulk(request: Request, format: Literal["csv", "jsonl"] = "csv", domain: Optional[str] = None):
+    """Grade a raw CSV/JSONL body of (session_id, question_id, answer) rows."""
+    body = (await request.body()).decode("utf-8")
+    try:
+        result = await run_in_threadpool(grade_text, body, format, domain)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    current_span().set(answers=result["answers"], sessions=len(result["sessions"]))
+    log_event("*", "graded_bulk", {k: result[k] for k in ("answers", "correct", "unknown_questions")}
+              | {"sessions": len(result["sessions"])})
+    return result
+
 @router.post("/session/reset")
-def session_reset(session_id: str):
-    reset_state(session_id)
+def session_reset(session_id: str, domain: Optional[str] = None):
+    reset_state(state_key(session_id, domain))
     log_event(session_id, "reset", {"note": "state cleared"})
     return {"status": "reset", "session_id": session_id}
 
+@router.get("/export/{kind}")
+def export_stream(
+    kind: Literal["learner_state", "audit"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    prefix: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+):
+    """Stream rows as NDJSON/CSV; since/until are ISO times (until exclusive)."""
+    try:
+        body = export_rows(kind, format, prefix, since, until)
+        first = next(body, "")   # surface filter errors as 400 before streaming starts
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media = "application/x-ndjson" if format == "ndjson" else "text/csv"
+
+    def _chain():
+        yield first
+        yield from body
+
+    return StreamingResponse(_chain(), media_type=media)
+
 # ----------- Utils -----------
 def _now() -> str:
     return datetime.utcnow().isoformat() + "Z"
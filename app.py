@@ -3,9 +3,16 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from api.routes import router as api_router
-from core.settings import USE_SQLITE, CORS_ORIGINS
+from core.loaders import UnknownDomain
+from core.tracing import TracingMiddleware
+from core.settings import USE_SQLITE, CORS_ORIGINS, USE_STATE_LOG
 if USE_SQLITE:
     from core.db import init_db
+    from core import analytics
+elif USE_STATE_LOG:
+    from core.settings import STATE_LOG_DIR, STATE_SNAPSHOT_INTERVAL_S, STATE_SNAPSHOT_MIN_OPS, STATE_LOG_FSYNC
+    from core.state import enable_state_log
+    from core.statelog import StateLog
 
 app = FastAPI(title="XAI Tutor PoC", version="0.1.0")
 
@@ -17,6 +24,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# added last so it wraps everything else: one root span per request
+app.add_middleware(TracingMiddleware)
 
 # Routes
 app.include_router(api_router)
@@ -24,6 +33,21 @@ app.include_router(api_router)
 # DB init
 if USE_SQLITE:
     init_db()
+    analytics.load()
+elif USE_STATE_LOG:
+    enable_state_log(StateLog(
+        STATE_LOG_DIR,
+        snapshot_interval_s=STATE_SNAPSHOT_INTERVAL_S,
+        snapshot_min_ops=STATE_SNAPSHOT_MIN_OPS,
+        fsync=STATE_LOG_FSYNC,
+    ))
+
+@app.exception_handler(UnknownDomain)
+async def unknown_domain_handler(request: Request, exc: UnknownDomain):
+    return JSONResponse(
+        status_code=404,
+        content={"error": "unknown_domain", "message": f"no curriculum bundle for domain {exc.args[0]!r}"},
+    )
 
 # Uniform error handler (fallback)
 @app.exception_handler(Exception)
@@ -0,0 +1,134 @@
+# core/admission.py
+"""
+Admission control for upstream LLM calls.
+
+Callers go through AdmissionController.run(), which either admits the call
+(respecting a concurrency limit, a token bucket for the upstream rate limit and
+a priority queue) or sheds it immediately by returning the caller's fallback.
+A call is shed when the queue is full, when the estimated wait already exceeds
+its latency budget, or when the budget runs out while it is still queued.
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict
+
+# lower value = served first
+PRIORITY_PRIMER = 0      # diagnostic "No" primer
+PRIORITY_CONTENT = 1     # content_only questions
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, burst: float):
+        self.rate = rate_per_s
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._ts = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._ts) * self.rate)
+        self._ts = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token would be available (0 if one is available now)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(time.monotonic())
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def take(self) -> float:
+        """Take a token, possibly going into debt; returns how long to wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        wait = self.wait_time()
+        self._tokens -= 1
+        return wait
+
+    def give_back(self):
+        self._tokens = min(self.burst, self._tokens + 1)
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int, max_queue: int, rate_per_s: float, burst: float,
+                 initial_latency_s: float = 2.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self._bucket = TokenBucket(rate_per_s, burst)
+        self._cond = threading.Condition()
+        self._heap: list = []                  # (priority, seq) of waiting calls
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._latency = initial_latency_s      # EWMA of upstream call time
+        self._admitted = 0
+        self._shed: Dict[str, int] = {"queue_full": 0, "over_budget": 0, "timed_out": 0}
+
+    # ---- Metrics ----
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queue_depth": len(self._heap),
+                "in_flight": self._in_flight,
+                "admitted": self._admitted,
+                "shed": sum(self._shed.values()),
+                "shed_by_reason": dict(self._shed),
+                "ewma_latency_ms": round(self._latency * 1000, 1),
+            }
+
+    # ---- Core ----
+    def _estimated_wait(self, priority: int) -> float:
+        ahead = sum(1 for p, _ in self._heap if p <= priority)
+        if self._in_flight >= self.max_concurrency:
+            ahead += 1
+        queue_wait = (ahead / self.max_concurrency) * self._latency
+        return queue_wait + self._bucket.wait_time()
+
+    def _shed_call(self, reason: str, fallback: Callable[[], Any]):
+        self._shed[reason] += 1
+        return fallback()
+
+    def run(self, fn: Callable[[float], Any], *, priority: int, budget_s: float,
+            fallback: Callable[[], Any]) -> Any:
+        """
+        Run fn(remaining_budget_s) if it can start within budget_s, else return fallback().
+        """
+        start = time.monotonic()
+        deadline = start + budget_s
+        with self._cond:
+            if len(self._heap) >= self.max_queue and self._in_flight >= self.max_concurrency:
+                return self._shed_call("queue_full", fallback)
+            if self._estimated_wait(priority) > budget_s:
+                return self._shed_call("over_budget", fallback)
+
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._heap, ticket)
+            while not (self._heap[0] == ticket and self._in_flight < self.max_concurrency):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._heap.remove(ticket)
+                    heapq.heapify(self._heap)
+                    self._cond.notify_all()
+                    return self._shed_call("timed_out", fallback)
+                self._cond.wait(remaining)
+            heapq.heappop(self._heap)
+            self._in_flight += 1
+
+            delay = self._bucket.take()
+            if time.monotonic() + delay > deadline:
+                self._bucket.give_back()
+                self._in_flight -= 1
+                self._cond.notify_all()
+                return self._shed_call("over_budget", fallback)
+            self._admitted += 1
+            self._cond.notify_all()
+
+        try:
+            if delay > 0:
+                time.sleep(delay)
+            t0 = time.monotonic()
+            result = fn(max(deadline - t0, 0.0))
+            with self._cond:
+                self._latency = 0.8 * self._latency + 0.2 * (time.monotonic() - t0)
+            return result
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
@@ -0,0 +1,203 @@
+# core/analytics.py
+"""
+Running cohort mastery aggregates.
+
+Counters are updated incrementally from the state/policy hooks (new session,
+update_score, reset, decision) so the report is O(skills) and never scans
+learner_state. In SQLite mode every change is also queued as an increment of
+the mastery_agg table, which is what the report reads, so it is shared by all
+workers.
+
+Seed the table once for existing data (stop the server first):
+
+    python -m core.analytics --backfill
+"""
+import json
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+from core import db as dbmod
+from core.audit import LOG_FILE
+from core.config import USE_SQLITE
+from core.loaders import load_skill_graph
+from core.policy import READY_THRESHOLD, SkillScore
+
+_lock = threading.Lock()
+_counters: Counter = Counter()     # (metric, key) -> value
+
+# metric names, also used as mastery_agg.metric
+SESSIONS = "sessions"
+ATTEMPTS = "attempts"
+CORRECT = "correct"
+READINESS = "readiness"            # key "<skill>|<bucket>", bucket = min(correct, READY_THRESHOLD)
+ACTIONS = "actions"
+
+def _bucket_key(skill: str, correct: int) -> str:
+    return f"{skill}|{min(correct, READY_THRESHOLD)}"
+
+_batch = threading.local()
+
+@contextmanager
+def collect():
+    """Buffer this thread's deltas and apply them once on exit (bulk jobs)."""
+    if getattr(_batch, "deltas", None) is not None:
+        yield
+        return
+    _batch.deltas = Counter()
+    try:
+        yield
+    finally:
+        buffered, _batch.deltas = _batch.deltas, None
+        _apply([(m, k, v) for (m, k), v in buffered.items()])
+
+def _apply(deltas: Iterable[Tuple[str, str, int]]):
+    buffered = getattr(_batch, "deltas", None)
+    if buffered is not None:
+        for metric, key, delta in deltas:
+            buffered[(metric, key)] += delta
+        return
+    deltas = [d for d in deltas if d[2]]
+    if not deltas:
+        return
+    with _lock:
+        for metric, key, delta in deltas:
+            _counters[(metric, key)] += delta
+    if USE_SQLITE:
+        dbmod.bump_counters(deltas)
+
+# ---- Hooks ----
+def on_session_created():
+    _apply([(SESSIONS, "", 1)])
+
+def on_session_reset(scores: Dict[str, SkillScore]):
+    deltas = [(SESSIONS, "", -1)]
+    deltas += [(READINESS, _bucket_key(skill, sc.correct), -1) for skill, sc in scores.items()]
+    _apply(deltas)
+
+def on_score(skill: str, attempts: int, correct: int, before: Optional[int], after: int):
+    """before: correct count prior to these answers, None if the skill had no score yet."""
+    deltas = [(ATTEMPTS, skill, attempts), (CORRECT, skill, correct)]
+    if before is None:
+        deltas.append((READINESS, _bucket_key(skill, after), 1))
+    elif _bucket_key(skill, before) != _bucket_key(skill, after):
+        deltas += [(READINESS, _bucket_key(skill, before), -1), (READINESS, _bucket_key(skill, after), 1)]
+    _apply(deltas)
+
+def on_decision(action: str):
+    _apply([(ACTIONS, action, 1)])
+
+# ---- Report ----
+def load():
+    """Replace in-memory counters with the persisted ones (SQLite mode)."""
+    rows = dbmod.load_counters()
+    with _lock:
+        _counters.clear()
+        for metric, key, value in rows:
+            _counters[(metric, key)] = value
+
+def mastery_report() -> Dict:
+    """
+    In SQLite mode the report is read from mastery_agg (O(skills) rows), so it
+    includes every worker's committed changes, not just this process's.
+    """
+    if USE_SQLITE:
+        counters = {(m, k): v for m, k, v in dbmod.load_counters()}
+    else:
+        with _lock:
+            counters = dict(_counters)
+    skill_ids = list(load_skill_graph()["skills"])
+    seen = {k.split("|", 1)[0] for (m, k) in counters if m == READINESS}
+    seen |= {k for (m, k) in counters if m == ATTEMPTS}
+    skill_ids += sorted(seen - set(skill_ids))
+
+    skills = {}
+    for sid in skill_ids:
+        attempts = counters.get((ATTEMPTS, sid), 0)
+        correct = counters.get((CORRECT, sid), 0)
+        hist = {}
+        for b in range(READY_THRESHOLD + 1):
+            label = "ready" if b == READY_THRESHOLD else str(b)
+            hist[label] = counters.get((READINESS, f"{sid}|{b}"), 0)
+        skills[sid] = {
+            "attempts": attempts,
+            "correct": correct,
+            "accuracy": round(correct / attempts, 3) if attempts else None,
+            "readiness": hist,
+        }
+    return {
+        "sessions": counters.get((SESSIONS, ""), 0),
+        "ready_threshold": READY_THRESHOLD,
+        "skills": skills,
+        "actions": {k: v for (m, k), v in counters.items() if m == ACTIONS},
+    }
+
+# ---- Backfill ----
+def backfill() -> Dict:
+    """
+    Recompute all counters with one pass over learner_state and audit.jsonl and
+    store them in mastery_agg. Attempts are seeded from the per-node question
+    index (questions served), since answers themselves are not stored.
+    """
+    totals: Counter = Counter()
+    for _, _, _, scores_json, pending_json, _ in dbmod.iter_states():
+        scores = json.loads(scores_json or "{}")
+        pending = json.loads(pending_json or "{}")
+        _count_state(totals, {k: int(sc.get("correct", 0)) for k, sc in scores.items()}, pending)
+    _count_actions(totals)
+
+    dbmod.replace_counters(
+        [(m, k, v) for (m, k), v in totals.items()],
+        [SESSIONS, ATTEMPTS, CORRECT, READINESS, ACTIONS],
+    )
+    with _lock:
+        _counters.clear()
+        _counters.update(totals)
+    return mastery_report()
+
+def rebuild(states: Iterable[Tuple[Dict[str, int], Dict[str, int]]]):
+    """
+    In-memory mode: recompute the counters from (correct per skill, pending
+    index per skill) of every live session, e.g. after restoring from the state log.
+    """
+    totals: Counter = Counter()
+    for correct, pending in states:
+        _count_state(totals, correct, pending)
+    _count_actions(totals)
+    with _lock:
+        _counters.clear()
+        _counters.update(totals)
+
+def _count_state(totals: Counter, correct: Dict[str, int], pending: Dict[str, int]):
+    totals[(SESSIONS, "")] += 1
+    for skill, c in correct.items():
+        totals[(CORRECT, skill)] += c
+        totals[(ATTEMPTS, skill)] += max(int(pending.get(skill, 0)), c)
+        totals[(READINESS, _bucket_key(skill, c))] += 1
+
+def _count_actions(totals: Counter):
+    if LOG_FILE.exists():
+        with open(LOG_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("kind") == "decision":
+                    action = (entry.get("payload") or {}).get("action")
+                    if action:
+                        totals[(ACTIONS, action)] += 1
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Cohort mastery aggregates")
+    ap.add_argument("--backfill", action="store_true", help="rebuild mastery_agg from learner_state and the audit log")
+    args = ap.parse_args()
+    dbmod.init_db()
+    if args.backfill:
+        report = backfill()
+    else:
+        load()
+        report = mastery_report()
+    print(json.dumps(report, indent=2))
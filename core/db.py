@@ -1,8 +1,21 @@
 # core/db.py
-import sqlite3
+import atexit
 import json
-from typing import Optional, Tuple
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from core.config import DB_PATH
+from core.settings import DB_COMMIT_MAX_OPS, DB_COMMIT_MAX_MS, DB_SHARDS
+from core.tracing import span
+
+log = logging.getLogger(__name__)
 
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS learner_state (
@@ -10,36 +23,517 @@ CREATE TABLE IF NOT EXISTS learner_state (
   current_node TEXT NOT NULL,
   skipped_diagnostic INTEGER NOT NULL,
   scores_json TEXT NOT NULL,
-  pending_json TEXT NOT NULL
+  pending_json TEXT NOT NULL,
+  updated_at TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS mastery_agg (
+  metric TEXT NOT NULL,
+  key TEXT NOT NULL,
+  value INTEGER NOT NULL,
+  PRIMARY KEY (metric, key)
 );
 """
 
-def _conn():
-    return sqlite3.connect(DB_PATH)
+_UPSERT = (
+    "INSERT INTO learner_state(session_id, skipped_diagnostic, current_node, scores_json, pending_json, updated_at) "
+    "VALUES(?,?,?,?,?,?) "
+    "ON CONFLICT(session_id) DO UPDATE SET skipped_diagnostic=excluded.skipped_diagnostic,"
+    " current_node=excluded.current_node, scores_json=excluded.scores_json, pending_json=excluded.pending_json,"
+    " updated_at=excluded.updated_at"
+)
+_DELETE = "DELETE FROM learner_state WHERE session_id = ?"
+_BUMP = (
+    "INSERT INTO mastery_agg(metric, key, value) VALUES(?,?,?) "
+    "ON CONFLICT(metric, key) DO UPDATE SET value = value + excluded.value"
+)
 
-def init_db():
-    with _conn() as c:
+def _conn(path: Optional[str] = None):
+    return sqlite3.connect(path or DB_PATH)
+
+# -------- Group-commit writer --------
+class _Writer:
+    """
+    Owns the only write connection. save/delete ops are queued and committed
+    together: one transaction per batch of at most `max_ops` ops, collected for
+    at most `max_ms` after the first op arrives.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str, max_ops: int, max_ms: float):
+        self.path = path
+        self.max_ops = max(1, max_ops)
+        self.max_wait = max(0.0, max_ms) / 1000.0
+        self._q: "queue.Queue" = queue.Queue()
+        # latest op per session that is not committed yet, so reads see our own writes
+        self._pending: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, session_id: Optional[str], sql: Optional[str], params) -> Future:
+        fut: Future = Future()
+        op = (sql, params)
+        overlay = [(session_id, op)] if session_id is not None else []
+        with self._lock:
+            for sid, o in overlay:
+                self._pending[sid] = o
+        self._q.put((overlay, op, fut))
+        return fut
+
+    def submit_rows(self, rows: List[tuple]) -> Future:
+        """Upsert many sessions as one op, i.e. inside a single transaction."""
+        fut: Future = Future()
+        overlay = [(r[0], (_UPSERT, r)) for r in rows]
+        with self._lock:
+            for sid, o in overlay:
+                self._pending[sid] = o
+        self._q.put((overlay, (_UPSERT, rows), fut))
+        return fut
+
+    def pending_row(self, session_id: str) -> Tuple[bool, Optional[tuple]]:
+        """(True, row-or-None) if an uncommitted op exists for the session."""
+        with self._lock:
+            op = self._pending.get(session_id)
+        if op is None:
+            return False, None
+        sql, params = op
+        # upsert params start with the same 5 columns load_state() selects
+        return True, (params[:5] if sql == _UPSERT else None)
+
+    def stop(self):
+        self._q.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        stopping = False
+        while not stopping:
+            first = self._q.get()
+            if first is self._STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_ops:
+                try:
+                    item = self._q.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._q.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(conn, batch)
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[tuple]):
+        with span("db.commit", path=self.path, ops=len(batch)) as s:
+            try:
+                with conn:
+                    for _, (sql, params), _ in batch:
+                        _apply(conn, sql, params)
+                errors = [None] * len(batch)
+            except Exception:
+                # isolate the failing op(s) so one bad row doesn't fail the whole group
+                s.set(retried_individually=True)
+                errors = []
+                for _, (sql, params), _ in batch:
+                    try:
+                        with conn:
+                            _apply(conn, sql, params)
+                        errors.append(None)
+                    except Exception as e:
+                        errors.append(e)
+                s.set(failed=sum(e is not None for e in errors))
+
+        with self._lock:
+            for overlay, _, _ in batch:
+                for sid, op in overlay:
+                    if self._pending.get(sid) is op:
+                        del self._pending[sid]
+        for (overlay, (sql, _), fut), err in zip(batch, errors):
+            if err is None:
+                fut.set_result(None)
+            else:
+                # most callers don't wait on the Future, so make the lost write visible
+                log.error("%s: write failed for %s: %s: %s", self.path,
+                          ", ".join(sid for sid, _ in overlay[:5]) or "-",
+                          (sql or "").split(" ", 1)[0], err)
+                fut.set_exception(err)
+
+def _apply(conn: sqlite3.Connection, sql: Optional[str], params):
+    if sql is None:         # flush barrier
+        return
+    if isinstance(params, list):
+        conn.executemany(sql, params)
+    else:
+        conn.execute(sql, params)
+
+# -------- Read-only connections (one per thread and file) --------
+_local = threading.local()
+
+def _read_conn(path: str) -> sqlite3.Connection:
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    c = conns.get(path)
+    if c is None:
+        uri = Path(path).resolve().as_uri() + "?mode=ro"
+        c = conns[path] = sqlite3.connect(uri, uri=True)
+    return c
+
+# -------- Shards --------
+class _Shard:
+    """One database file: its group-commit writer plus per-thread readers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writer: Optional[_Writer] = None
+        self._lock = threading.Lock()
+
+    def writer(self) -> _Writer:
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = _Writer(self.path, DB_COMMIT_MAX_OPS, DB_COMMIT_MAX_MS)
+        return self._writer
+
+    def pending_row(self, session_id: str) -> Tuple[bool, Optional[tuple]]:
+        if self._writer is None:
+            return False, None
+        return self._writer.pending_row(session_id)
+
+    def read(self) -> sqlite3.Connection:
+        return _read_conn(self.path)
+
+    def flush(self, timeout: Optional[float] = None):
+        if self._writer is not None:
+            self._writer.submit(None, None, ()).result(timeout)
+
+    def close(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.stop()
+                self._writer = None
+
+def shard_paths(n: int, base: Optional[str] = None) -> List[str]:
+    """Files holding learner_state for n shards; n == 1 is the plain DB_PATH file."""
+    base = base or DB_PATH
+    if n <= 1:
+        return [base]
+    p = Path(base)
+    return [str(p.with_name(f"{p.stem}.{i}-of-{n}{p.suffix}")) for i in range(n)]
+
+def shard_index(session_id: str, n: int) -> int:
+    # crc32 rather than hash(): must be stable across processes and restarts
+    return zlib.crc32(session_id.encode("utf-8")) % n if n > 1 else 0
+
+_layout_lock = threading.Lock()
+_meta: Optional[_Shard] = None          # DB_PATH: global tables (mastery_agg)
+_shards: List[_Shard] = []              # learner_state, routed by shard_index()
+
+def _layout() -> Tuple[_Shard, List[_Shard]]:
+    global _meta, _shards
+    if _meta is None:
+        with _layout_lock:
+            if _meta is None:
+                meta = _Shard(DB_PATH)
+                paths = shard_paths(DB_SHARDS)
+                # with one shard, state and meta share the file and therefore the writer
+                _shards = [meta] if paths == [DB_PATH] else [_Shard(p) for p in paths]
+                _meta = meta
+    return _meta, _shards
+
+def _shard_for(session_id: str) -> _Shard:
+    shards = _layout()[1]
+    return shards[shard_index(session_id, len(shards))]
+
+def _init_file(path: str):
+    with _conn(path) as c:
         c.executescript(SCHEMA)
+        c.execute("PRAGMA journal_mode=WAL")
+        cols = {r[1] for r in c.execute("PRAGMA table_info(learner_state)")}
+        if "updated_at" not in cols:   # databases created before updated_at existed
+            c.execute("ALTER TABLE learner_state ADD COLUMN updated_at TEXT NOT NULL DEFAULT ''")
+
+# -------- Public API --------
+def _now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+def _unsharded_rows(path: str) -> bool:
+    if not Path(path).exists():
+        return False
+    with _conn(path) as c:
+        if c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='learner_state'").fetchone() is None:
+            return False
+        return c.execute("SELECT 1 FROM learner_state LIMIT 1").fetchone() is not None
+
+def init_db():
+    # with DB_SHARDS > 1, rows left in DB_PATH would be invisible: refuse rather than lose them
+    if DB_SHARDS > 1 and _unsharded_rows(DB_PATH):
+        raise RuntimeError(
+            f"{DB_PATH} still holds learner_state rows but DB_SHARDS={DB_SHARDS}; "
+            f"stop the server and run `python -m core.db reshard --from 1 --to {DB_SHARDS}` first")
+    meta, shards = _layout()
+    for path in dict.fromkeys([meta.path] + [s.path for s in shards]):
+        _init_file(path)
 
 def load_state(session_id: str) -> Optional[Tuple[str, int, str, str, str]]:
-    with _conn() as c:
-        cur = c.execute(
+    with span("db.load_state") as s:
+        shard = _shard_for(session_id)
+        found, row = shard.pending_row(session_id)
+        s.set(path=shard.path, pending_hit=found)
+        if found:
+            return row
+        cur = shard.read().execute(
             "SELECT session_id, skipped_diagnostic, current_node, scores_json, pending_json "
             "FROM learner_state WHERE session_id = ?", (session_id,)
         )
-        row = cur.fetchone()
-        return row  # or None
-
-def save_state(session_id: str, current_node: str, skipped: bool, scores: dict, pending: dict):
-    with _conn() as c:
-        c.execute(
-            "INSERT INTO learner_state(session_id, skipped_diagnostic, current_node, scores_json, pending_json) "
-            "VALUES(?,?,?,?,?) "
-            "ON CONFLICT(session_id) DO UPDATE SET skipped_diagnostic=excluded.skipped_diagnostic,"
-            " current_node=excluded.current_node, scores_json=excluded.scores_json, pending_json=excluded.pending_json",
-            (session_id, 1 if skipped else 0, current_node, json.dumps(scores), json.dumps(pending))
-        )
+        return cur.fetchone()  # or None
+
+def save_state(session_id: str, current_node: str, skipped: bool, scores: dict, pending: dict) -> Future:
+    """Queue an upsert; the returned Future resolves once it is committed."""
+    with span("db.save_state"):
+        params = (session_id, 1 if skipped else 0, current_node, json.dumps(scores), json.dumps(pending), _now())
+        return _shard_for(session_id).writer().submit(session_id, _UPSERT, params)
+
+def load_states(session_ids: List[str]) -> Dict[str, Tuple[str, int, str, str, str]]:
+    """Batch load_state(): one IN (...) query per shard and 500 ids; missing ids are absent."""
+    with span("db.load_states", sessions=len(session_ids)):
+        return _load_states(session_ids)
+
+def _load_states(session_ids: List[str]) -> Dict[str, Tuple[str, int, str, str, str]]:
+    by_shard: Dict[int, List[str]] = {}
+    shards = _layout()[1]
+    for sid in session_ids:
+        by_shard.setdefault(shard_index(sid, len(shards)), []).append(sid)
+
+    out: Dict[str, tuple] = {}
+    for i, ids in by_shard.items():
+        shard = shards[i]
+        todo = []
+        for sid in ids:
+            found, row = shard.pending_row(sid)
+            if not found:
+                todo.append(sid)
+            elif row is not None:
+                out[sid] = row
+        for k in range(0, len(todo), 500):
+            part = todo[k:k + 500]
+            cur = shard.read().execute(
+                "SELECT session_id, skipped_diagnostic, current_node, scores_json, pending_json "
+                f"FROM learner_state WHERE session_id IN ({','.join('?' * len(part))})", part
+            )
+            for row in cur:
+                out[row[0]] = row
+    return out
+
+def save_states(items: List[Tuple[str, str, bool, dict, dict]]) -> List[Future]:
+    """
+    Batch save_state() for (session_id, current_node, skipped, scores, pending)
+    items: each shard gets one op, committed in one transaction.
+    """
+    with span("db.save_states", sessions=len(items)):
+        now = _now()
+        by_shard: Dict[int, List[tuple]] = {}
+        shards = _layout()[1]
+        for session_id, current_node, skipped, scores, pending in items:
+            row = (session_id, 1 if skipped else 0, current_node, json.dumps(scores), json.dumps(pending), now)
+            by_shard.setdefault(shard_index(session_id, len(shards)), []).append(row)
+        return [shards[i].writer().submit_rows(rows) for i, rows in by_shard.items()]
+
+def delete_state(session_id: str) -> Future:
+    with span("db.delete_state"):
+        return _shard_for(session_id).writer().submit(session_id, _DELETE, (session_id,))
+
+def bump_counters(deltas: List[Tuple[str, str, int]]) -> Future:
+    """Queue (metric, key, delta) increments of the mastery_agg table."""
+    return _layout()[0].writer().submit(None, _BUMP, list(deltas))
+
+def load_counters() -> List[Tuple[str, str, int]]:
+    return _layout()[0].read().execute("SELECT metric, key, value FROM mastery_agg").fetchall()
+
+def _iter_file(
+    path: str,
+    chunk: int,
+    prefix: Optional[str],
+    since: Optional[str],
+    until: Optional[str],
+):
+    where, args = ["session_id > ?"], []
+    if prefix:
+        where.append("session_id >= ? AND session_id < ?")
+        args += [prefix, prefix + "\U0010ffff"]
+    if since:
+        where.append("updated_at >= ?")
+        args.append(since)
+    if until:
+        where.append("updated_at < ?")
+        args.append(until)
+    sql = (
+        "SELECT session_id, skipped_diagnostic, current_node, scores_json, pending_json, updated_at "
+        f"FROM learner_state WHERE {' AND '.join(where)} ORDER BY session_id LIMIT ?"
+    )
+    last = ""
+    while True:
+        rows = _read_conn(path).execute(sql, (last, *args, chunk)).fetchall()
+        if not rows:
+            return
+        yield from rows
+        last = rows[-1][0]
+
+def _parallel(gens: list, depth: int):
+    """Drain generators on one thread each, interleaving their items through a bounded queue."""
+    q: "queue.Queue" = queue.Queue(maxsize=depth)
+    done = object()
+    cancelled = threading.Event()
+
+    def pump(gen):
+        try:
+            for item in gen:
+                while not cancelled.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if cancelled.is_set():
+                    return
+        except Exception as e:
+            q.put(e)
+        finally:
+            q.put(done)
+
+    threads = [threading.Thread(target=pump, args=(g,), daemon=True) for g in gens]
+    for t in threads:
+        t.start()
+    remaining = len(threads)
+    try:
+        while remaining:
+            item = q.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        cancelled.set()
+        while remaining:            # unblock pumps still trying to put
+            if q.get() is done:
+                remaining -= 1
+
+def iter_states(
+    chunk: int = 1000,
+    prefix: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    paths: Optional[List[str]] = None,
+):
+    """
+    Yield (session_id, skipped_diagnostic, current_node, scores_json, pending_json,
+    updated_at) rows. Each chunk is its own short keyset query, so no read
+    transaction is held open between chunks and writers are never blocked.
+    since/until filter on updated_at (ISO strings, until exclusive).
+
+    Rows are in session_id order within a shard; with several shards, all of
+    them are scanned in parallel and their rows interleave.
+    """
+    if paths is None:
+        for shard in _layout()[1]:
+            shard.flush()
+        paths = [s.path for s in _layout()[1]]
+    gens = [_iter_file(p, chunk, prefix, since, until) for p in paths]
+    if len(gens) == 1:
+        yield from gens[0]
+    else:
+        yield from _parallel(gens, depth=chunk * 2)
+
+def replace_counters(rows: List[Tuple[str, str, int]], metrics: List[str]):
+    """Atomically replace all counters of the given metrics (used by backfill)."""
+    meta = _layout()[0]
+    meta.flush()
+    with _conn(meta.path) as c:
+        c.executemany("DELETE FROM mastery_agg WHERE metric = ?", [(m,) for m in metrics])
+        c.executemany("INSERT INTO mastery_agg(metric, key, value) VALUES(?,?,?)", rows)
+
+def flush(timeout: Optional[float] = None):
+    """Block until every op queued before this call is committed."""
+    if _meta is None:
+        return
+    for shard in dict.fromkeys([_meta] + _shards):
+        shard.flush(timeout)
+
+def close():
+    """Drain and stop the writer threads; the layout is re-read on next use."""
+    global _meta, _shards
+    with _layout_lock:
+        if _meta is not None:
+            for shard in dict.fromkeys([_meta] + _shards):
+                shard.close()
+        _meta, _shards = None, []
+
+# -------- Resharding (offline: stop the server first) --------
+def reshard(old_n: int, new_n: int, base: Optional[str] = None, chunk: int = 5000) -> int:
+    """
+    Move every learner_state row from the old_n layout to the new_n layout.
+    Source shards are scanned in parallel; rows are routed by shard_index()
+    and written through one group-commit writer per target file. Sources are
+    emptied only after all targets committed. Returns the number of rows moved.
+    """
+    if old_n == new_n:
+        return 0
+    old_paths, new_paths = shard_paths(old_n, base), shard_paths(new_n, base)
+    for p in new_paths:
+        _init_file(p)
+    writers = [_Writer(p, max_ops=64, max_ms=0) for p in new_paths]
+    buffers: List[list] = [[] for _ in new_paths]
+    futures: List[Future] = []
+    moved = 0
+    try:
+        for row in iter_states(chunk=chunk, paths=[p for p in old_paths if Path(p).exists()]):
+            i = shard_index(row[0], new_n)
+            buffers[i].append(tuple(row))
+            moved += 1
+            if len(buffers[i]) >= chunk:
+                futures.append(writers[i].submit(None, _UPSERT, buffers[i]))
+                buffers[i] = []
+        for i, buf in enumerate(buffers):
+            if buf:
+                futures.append(writers[i].submit(None, _UPSERT, buf))
+        for f in futures:
+            f.result()
+    finally:
+        for w in writers:
+            w.stop()
+
+    for p in old_paths:
+        if p in new_paths or not Path(p).exists():
+            continue
+        if p == (base or DB_PATH):
+            with _conn(p) as c:          # keeps mastery_agg; only the rows move
+                c.execute("DELETE FROM learner_state")
+        else:
+            for suffix in ("", "-wal", "-shm"):
+                Path(p + suffix).unlink(missing_ok=True)
+    return moved
+
+atexit.register(close)
 
-def delete_state(session_id: str):
-    with _conn() as c:
-        c.execute("DELETE FROM learner_state WHERE session_id = ?", (session_id,))
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="learner_state shard maintenance")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rs = sub.add_parser("reshard", help="move rows to a new shard count, then set DB_SHARDS to it")
+    rs.add_argument("--from", dest="old_n", type=int, default=DB_SHARDS)
+    rs.add_argument("--to", dest="new_n", type=int, required=True)
+    args = ap.parse_args()
+    n = reshard(args.old_n, args.new_n)
+    print(f"moved {n} rows: {args.old_n} -> {args.new_n} shards ({', '.join(shard_paths(args.new_n))})")
@@ -0,0 +1,88 @@
+# core/decision_cache.py
+"""
+Memoized policy decisions and their rendered rationale.
+
+decide_next() only reads the current node, its prerequisites' scores, the
+pending count and the skipped flag, so those (plus the intent) make up the
+fingerprint; two learners in the same configuration get the same Decision
+and the same rationale text. Entries are per domain and dropped as soon as a
+different content version of that domain shows up. Bounded LRU.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from core.policy import SkillScore
+
+def fingerprint(
+    intent: str,
+    current_node: str,
+    scores: Dict[str, SkillScore],
+    prerequisites: Dict[str, List[str]],
+    pending_items_in_node: int,
+    skipped_diagnostic: bool,
+) -> Tuple:
+    """Hashable key covering every input decide_next() and the rationale templates read."""
+    node = scores.get(current_node)
+    prereq_scores = []
+    for p in prerequisites.get(current_node, []):
+        s = scores.get(p)
+        prereq_scores.append((s.correct, s.total) if s is not None else (0, 0))
+    return (
+        intent,
+        current_node,
+        bool(skipped_diagnostic),
+        pending_items_in_node,
+        (node.correct, node.total) if node is not None else (0, 0),
+        tuple(prereq_scores),
+    )
+
+class DecisionCache:
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Hashable], Any]" = OrderedDict()
+        self._versions: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _check_version(self, domain: str, version: str) -> None:
+        if self._versions.get(domain) == version:
+            return
+        if domain in self._versions:
+            stale = [k for k in self._entries if k[0] == domain]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+        self._versions[domain] = version
+
+    def get(self, domain: str, version: str, fp: Hashable) -> Optional[Any]:
+        with self._lock:
+            self._check_version(domain, version)
+            value = self._entries.get((domain, fp))
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((domain, fp))
+            self.hits += 1
+            return value
+
+    def put(self, domain: str, version: str, fp: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_version(domain, version)
+            self._entries[(domain, fp)] = value
+            self._entries.move_to_end((domain, fp))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "invalidations": self.invalidations}
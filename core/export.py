@@ -0,0 +1,148 @@
+# core/export.py
+"""
+Streaming bulk export of learner state and the audit log.
+
+Rows are produced by generators (keyset-paged SQLite reads / line-by-line file
+reads) and encoded chunk by chunk, so memory stays flat regardless of table
+size and live save_state writers are never blocked.
+
+CLI:
+    python -m core.export learner_state --format csv --since 2026-10-01 --out state.csv
+    python -m core.export audit --prefix t1 > audit.ndjson
+"""
+import csv
+import io
+import json
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from core import db as dbmod
+from core.audit import LOG_FILE
+from core.config import USE_SQLITE
+from core.loaders import load_skill_graph
+from core.settings import EXPORT_CHUNK_ROWS
+
+FORMATS = ("ndjson", "csv")
+AUDIT_COLUMNS = ["ts", "session_id", "kind", "payload"]
+
+# ---- Learner state ----
+def _flatten_state(session_id: str, skipped, current_node: str, scores: Dict, pending: Dict,
+                   updated_at: Optional[str]) -> Dict:
+    row = {
+        "session_id": session_id,
+        "current_node": current_node,
+        "skipped_diagnostic": bool(skipped),
+        "updated_at": updated_at or None,
+    }
+    for skill, sc in scores.items():
+        row[f"score.{skill}.correct"] = sc.get("correct", 0)
+        row[f"score.{skill}.total"] = sc.get("total", 0)
+    for skill, idx in pending.items():
+        row[f"pending.{skill}"] = idx
+    return row
+
+def learner_state_columns() -> List[str]:
+    cols = ["session_id", "current_node", "skipped_diagnostic", "updated_at"]
+    for skill in load_skill_graph()["skills"]:
+        cols += [f"score.{skill}.correct", f"score.{skill}.total", f"pending.{skill}"]
+    return cols
+
+def iter_learner_state(prefix: Optional[str] = None, since: Optional[str] = None,
+                       until: Optional[str] = None) -> Iterator[Dict]:
+    if not USE_SQLITE:
+        if since or until:
+            raise ValueError("time filters need USE_SQLITE (in-memory state has no updated_at)")
+        from core.state import _STORE, _state_to_serializable_dict
+        for sid in sorted(_STORE):
+            st = _STORE.get(sid)
+            if st is None or (prefix and not sid.startswith(prefix)):
+                continue
+            d = _state_to_serializable_dict(st)
+            yield _flatten_state(sid, d["skipped_diagnostic"], d["current_node"], d["scores"], d["pending"], None)
+        return
+
+    for sid, skipped, node, scores_json, pending_json, updated_at in dbmod.iter_states(
+        chunk=EXPORT_CHUNK_ROWS, prefix=prefix, since=since, until=until
+    ):
+        yield _flatten_state(sid, skipped, node, json.loads(scores_json or "{}"),
+                             json.loads(pending_json or "{}"), updated_at)
+
+# ---- Audit log ----
+def iter_audit(prefix: Optional[str] = None, since: Optional[str] = None,
+               until: Optional[str] = None) -> Iterator[Dict]:
+    if not LOG_FILE.exists():
+        return
+    with open(LOG_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue            # partially written last line
+            ts = entry.get("ts", "")
+            if since and ts < since:
+                continue
+            if until and ts >= until:
+                continue
+            if prefix and not str(entry.get("session_id", "")).startswith(prefix):
+                continue
+            yield entry
+
+# ---- Encoders ----
+def to_ndjson(rows: Iterable[Dict], chunk: int = EXPORT_CHUNK_ROWS) -> Iterator[str]:
+    buf: List[str] = []
+    for row in rows:
+        buf.append(json.dumps(row, ensure_ascii=False))
+        if len(buf) >= chunk:
+            yield "\n".join(buf) + "\n"
+            buf = []
+    if buf:
+        yield "\n".join(buf) + "\n"
+
+def to_csv(rows: Iterable[Dict], columns: List[str], chunk: int = EXPORT_CHUNK_ROWS) -> Iterator[str]:
+    out = io.StringIO()
+    w = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+    w.writeheader()
+    n = 0
+    for row in rows:
+        if isinstance(row.get("payload"), (dict, list)):
+            row = {**row, "payload": json.dumps(row["payload"], ensure_ascii=False)}
+        w.writerow(row)
+        n += 1
+        if n >= chunk:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+            n = 0
+    yield out.getvalue()
+
+def export(kind: str, fmt: str = "ndjson", prefix: Optional[str] = None, since: Optional[str] = None,
+           until: Optional[str] = None) -> Iterator[str]:
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format: {fmt}")
+    if kind == "learner_state":
+        rows, columns = iter_learner_state(prefix, since, until), learner_state_columns()
+    elif kind == "audit":
+        rows, columns = iter_audit(prefix, since, until), AUDIT_COLUMNS
+    else:
+        raise ValueError(f"unknown export: {kind}")
+    return to_ndjson(rows) if fmt == "ndjson" else to_csv(rows, columns)
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    ap = argparse.ArgumentParser(description="Stream learner_state or audit rows as NDJSON/CSV")
+    ap.add_argument("kind", choices=["learner_state", "audit"])
+    ap.add_argument("--format", choices=FORMATS, default="ndjson")
+    ap.add_argument("--prefix", help="session_id prefix")
+    ap.add_argument("--since", help="ISO time, inclusive")
+    ap.add_argument("--until", help="ISO time, exclusive")
+    ap.add_argument("--out", help="output file (default: stdout)")
+    args = ap.parse_args()
+    if USE_SQLITE:
+        dbmod.init_db()
+    out = open(args.out, "w", encoding="utf-8", newline="") if args.out else sys.stdout
+    try:
+        for piece in export(args.kind, args.format, args.prefix, args.since, args.until):
+            out.write(piece)
+    finally:
+        if args.out:
+            out.close()
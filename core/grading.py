@@ -0,0 +1,175 @@
+# core/grading.py
+"""
+Answer keys and bulk (offline) grading.
+
+The question bank is compiled once into a dict of normalized answer keys, so
+grading an answer is a dict lookup plus one string compare. Bulk uploads are
+validated in full before any state changes, then graded in chunks: answers
+are first tallied per (session, skill), then each chunk's sessions are loaded
+with one query per shard, every tally is applied as a single score update,
+and the states are written back as one transaction per shard.
+
+CLI:
+    python -m core.grading answers.csv            # header: session_id,question_id,answer
+    python -m core.grading answers.jsonl --format jsonl --out summary.json
+"""
+import csv
+import json
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from core import analytics
+from core.loaders import load_domain
+from core.settings import GRADE_CHUNK_ROWS
+from core.state import get_states, save_states, apply_scores, state_key
+
+FORMATS = ("csv", "jsonl")
+COLUMNS = ("session_id", "question_id", "answer")
+
+def normalize_answer(answer: Any) -> str:
+    return str(answer).strip()
+
+def answer_key(domain: Optional[str] = None) -> Dict[str, Tuple[str, str, Any, int]]:
+    """question_id -> (normalized answer, skill, raw answer, number of questions for the skill)."""
+    b = load_domain(domain)
+
+    def build():
+        qs = b.questions
+        return {
+            q["id"]: (normalize_answer(q["answer"]), q["skill"], q["answer"], len(qs["by_skill"][q["skill"]]))
+            for q in qs["all"]
+        }
+    return b.memo("answer_key", build)
+
+# ---- Parsers ----
+def parse_csv(lines: Iterable[str]) -> Iterator[Tuple[str, str, str]]:
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    try:
+        idx = [header.index(c) for c in COLUMNS]
+    except ValueError:
+        raise ValueError(f"CSV header must contain {', '.join(COLUMNS)}")
+    si, qi, ai = idx
+    width = max(idx) + 1
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            raise ValueError(f"line {reader.line_num}: expected at least {width} columns, got {len(row)}")
+        yield row[si], row[qi], row[ai]
+
+def parse_jsonl(lines: Iterable[str]) -> Iterator[Tuple[str, str, str]]:
+    for n, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            d = json.loads(line)
+            yield d["session_id"], d["question_id"], d.get("answer", "")
+        except (ValueError, KeyError, TypeError):
+            raise ValueError(f"line {n}: expected a JSON object with session_id, question_id, answer")
+
+def parse(lines: Iterable[str], fmt: str) -> Iterator[Tuple[str, str, str]]:
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format: {fmt}")
+    return parse_csv(lines) if fmt == "csv" else parse_jsonl(lines)
+
+# ---- Engine ----
+def _grade_chunk(rows: list, sessions: Dict[str, Dict], totals: Dict[str, int], domain: Optional[str]) -> list:
+    key = answer_key(domain)
+    # pass 1: grade and tally per (session, skill) -- no state is touched yet
+    tally: Dict[Tuple[str, str], list] = {}
+    unknown: Dict[str, int] = {}
+    for sid, qid, answer in rows:
+        k = key.get(qid)
+        if k is None:
+            unknown[sid] = unknown.get(sid, 0) + 1
+            continue
+        t = tally.get((sid, k[1]))
+        if t is None:
+            t = tally[(sid, k[1])] = [0, 0, k[3]]
+        t[0] += 1
+        if normalize_answer(answer) == k[0]:
+            t[1] += 1
+
+    # pass 2: one score update per (session, skill), then one batched save
+    states = get_states(state_key(sid, domain) for sid, _ in tally)
+    with analytics.collect():
+        for (sid, skill), (answered, correct, total_for_node) in tally.items():
+            apply_scores(states[state_key(sid, domain)], skill, answered, correct, total_for_node)
+            summ = _summary(sessions, sid)
+            summ["answered"] += answered
+            summ["correct"] += correct
+            per_skill = summ["by_skill"].setdefault(skill, {"answered": 0, "correct": 0})
+            per_skill["answered"] += answered
+            per_skill["correct"] += correct
+    for sid, n in unknown.items():
+        summ = _summary(sessions, sid)
+        summ["answered"] += n
+        summ["unknown_questions"] += n
+
+    totals["answers"] += len(rows)
+    totals["unknown_questions"] += sum(unknown.values())
+    return save_states(states)
+
+def _summary(sessions: Dict[str, Dict], sid: str) -> Dict:
+    summ = sessions.get(sid)
+    if summ is None:
+        summ = sessions[sid] = {"answered": 0, "correct": 0, "unknown_questions": 0, "by_skill": {}}
+    return summ
+
+def grade_rows(rows: Iterable[Tuple[str, str, str]], chunk: int = GRADE_CHUNK_ROWS,
+               domain: Optional[str] = None) -> Dict:
+    """Grade (session_id, question_id, answer) rows; returns totals plus per-session summaries."""
+    started = time.perf_counter()
+    sessions: Dict[str, Dict] = {}
+    totals = {"answers": 0, "unknown_questions": 0}
+    futures = []
+    it = iter(rows)
+    while True:
+        part = list(islice(it, chunk))
+        if not part:
+            break
+        futures += _grade_chunk(part, sessions, totals, domain)
+    for f in futures:
+        f.result()              # surface write errors before reporting success
+    return {
+        **totals,
+        "correct": sum(s["correct"] for s in sessions.values()),
+        "sessions": sessions,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+def grade_text(text: str, fmt: str, domain: Optional[str] = None) -> Dict:
+    # parse everything up front: a bad line must fail the upload before any state changes
+    rows = list(parse(text.splitlines(), fmt))
+    return grade_rows(rows, domain=domain)
+
+if __name__ == "__main__":
+    import argparse
+    from core.config import USE_SQLITE
+    ap = argparse.ArgumentParser(description="Bulk-grade an answer file")
+    ap.add_argument("path")
+    ap.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    ap.add_argument("--out", help="write the JSON summary here (default: stdout)")
+    ap.add_argument("--domain", help="curriculum domain (default: DEFAULT_DOMAIN)")
+    args = ap.parse_args()
+    fmt = args.format or ("jsonl" if args.path.endswith((".jsonl", ".ndjson")) else "csv")
+    if USE_SQLITE:
+        from core.db import init_db
+        init_db()
+    with open(args.path, "r", encoding="utf-8", newline="") as f:
+        for _ in parse(f, fmt):     # dry pass: reject a bad file before grading any of it
+            pass
+        f.seek(0)
+        result = grade_rows(parse(f, fmt), domain=args.domain)
+    out = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out)
+        print(f"graded {result['answers']} answers for {len(result['sessions'])} sessions "
+              f"in {result['elapsed_s']}s -> {args.out}")
+    else:
+        print(out)
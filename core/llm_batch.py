@@ -0,0 +1,134 @@
+# core/llm_batch.py
+"""
+Micro-batching for LLM generation.
+
+Callers submit one prompt each and get a Future. A dispatcher thread collects
+prompts that arrive within `window_ms` of the first one (or until `max_batch`
+are waiting) and hands the whole list to a backend in one call; the backend
+returns one result per prompt, in order, which is fanned back out to the
+waiting Futures. A result that is an Exception fails only its own Future.
+
+Every item carries its caller's deadline. Items that expired (or whose Future
+was cancelled) while waiting are dropped before dispatch, and the backend call
+is given a timeout that ends at the latest deadline in the batch, so upstream
+work never outlives every caller's latency budget.
+
+Backends are callables `(List[str], timeout_s) -> List[result | Exception]`,
+e.g. HttpBatchBackend, which POSTs the whole batch to a batch endpoint such as
+a self-hosted inference gateway: {"prompts": [...]} -> {"outputs": [...]}.
+Batching only pays off against such an endpoint; for one-prompt-per-call
+APIs it would add window latency and save nothing upstream.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+import httpx
+
+Backend = Callable[[List[str], Optional[float]], List[Any]]
+
+class MicroBatcher:
+    _STOP = object()
+
+    def __init__(self, backend: Backend, window_ms: float = 5.0, max_batch: int = 16, max_inflight: int = 4):
+        self.backend = backend
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        # batches already sent keep running while the next one is being collected
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_inflight), thread_name_prefix="llm-batch")
+        self._q: "queue.Queue" = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self.expired = 0
+        self._thread = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str, deadline: Optional[float] = None) -> Future:
+        """deadline: time.monotonic() value after which the caller no longer waits."""
+        fut: Future = Future()
+        self._q.put((prompt, fut, deadline))
+        return fut
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "expired": self.expired,
+        }
+
+    def close(self):
+        self._q.put(self._STOP)
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+
+    def _run(self):
+        while True:
+            first = self._q.get()
+            if first is self._STOP:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._pool.submit(self._dispatch, batch)
+            if stop:
+                return
+
+    def _live(self, batch: list) -> list:
+        """Drop cancelled and expired items; the rest are marked running."""
+        now = time.monotonic()
+        live = []
+        for item in batch:
+            _, fut, deadline = item
+            if not fut.set_running_or_notify_cancel():
+                self.expired += 1
+            elif deadline is not None and deadline <= now:
+                self.expired += 1
+                fut.set_exception(TimeoutError("LLM budget expired before dispatch"))
+            else:
+                live.append(item)
+        return live
+
+    def _dispatch(self, batch: list):
+        batch = self._live(batch)
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        deadlines = [d for _, _, d in batch]
+        timeout_s = None if None in deadlines else max(max(deadlines) - time.monotonic(), 0.0)
+        try:
+            results = self.backend([p for p, _, _ in batch], timeout_s)
+            if len(results) != len(batch):
+                raise RuntimeError(f"backend returned {len(results)} results for {len(batch)} prompts")
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, fut, _), res in zip(batch, results):
+            if isinstance(res, Exception):
+                fut.set_exception(res)
+            else:
+                fut.set_result(res)
+
+class HttpBatchBackend:
+    def __init__(self, url: str, timeout_s: float = 60.0, headers: Optional[dict] = None):
+        self.url = url
+        self.timeout_s = timeout_s
+        self._client = httpx.Client(timeout=timeout_s, headers=headers or {})
+
+    def __call__(self, prompts: List[str], timeout_s: Optional[float] = None) -> List[Any]:
+        timeout = self.timeout_s if timeout_s is None else min(self.timeout_s, timeout_s)
+        r = self._client.post(self.url, json={"prompts": prompts}, timeout=timeout)
+        r.raise_for_status()
+        return r.json()["outputs"]
@@ -1,68 +1,197 @@
+import logging
 import os
+import time
+from concurrent.futures import TimeoutError as FuturesTimeout
 from google.api_core.exceptions import ServiceUnavailable # Correct source for the exception
 from google.api_core import retry                       # Required for the @retry.Retry decorator
 from google import genai
 from google.genai import types
-from core.settings import GEMINI_API_KEY
+from core.settings import (
+    GEMINI_API_KEY,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_RATE_PER_S,
+    LLM_BURST,
+    LLM_BUDGET_PRIMER_S,
+    LLM_BUDGET_CONTENT_S,
+    PROMPT_CACHE_THRESHOLD,
+    PROMPT_CACHE_MAX_ENTRIES,
+    LLM_BATCH_WINDOW_MS,
+    LLM_BATCH_MAX,
+    LLM_BATCH_URL,
+)
+from core.admission import AdmissionController, PRIORITY_PRIMER, PRIORITY_CONTENT
+from core.prompt_cache import PromptCache
+from core.llm_batch import MicroBatcher, HttpBatchBackend
+from core.tracing import span, current_span
+
+log = logging.getLogger(__name__)
 
 # Define a retry strategy for 503 errors
 # This is a basic retry with exponential backoff: wait 1s, 2s, 4s, 8s, 16s...
 # We use the built-in decorator for ServiceUnavailable exceptions.
 
-@retry.Retry(
+_RETRY = retry.Retry(
     predicate=retry.if_exception_type(ServiceUnavailable),
     initial=1.0,  # Initial delay in seconds
     delay=2.0,    # Exponential factor (1, 2, 4, 8, ...)
     timeout=60.0, # Max time to spend retrying (e.g., 60 seconds)
     maximum=30.0  # Max delay between attempts
 )
-def _generate_content_with_retry(client, prompt_text, config):
-    """Internal function to make the API call, decorated for retries."""
+_RETRY_TIMEOUT = 60.0
+
+def _generate_content(client, prompt_text, config):
+    """Internal function to make the API call."""
     return client.models.generate_content(
         model="gemini-2.5-flash", 
         contents=prompt_text,
         config=config
     )
 
+# Admission control: every upstream call must start (and retry) within its
+# latency budget, otherwise the request gets the fallback right away.
+_admission = AdmissionController(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_queue=LLM_MAX_QUEUE,
+    rate_per_s=LLM_RATE_PER_S,
+    burst=LLM_BURST,
+)
+
+_BUDGETS = {PRIORITY_PRIMER: LLM_BUDGET_PRIMER_S, PRIORITY_CONTENT: LLM_BUDGET_CONTENT_S}
+
+# Near-duplicate answers for free-form prompts, scoped per skill node.
+_prompt_cache = PromptCache(threshold=PROMPT_CACHE_THRESHOLD, max_entries=PROMPT_CACHE_MAX_ENTRIES)
+
+# One client for the whole process: its HTTP connection pool is shared by all calls.
+_client = None
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = genai.Client(api_key=GEMINI_API_KEY)
+    return _client
+
+def _generation_config(timeout_s=_RETRY_TIMEOUT):
+    # Set a low temperature for factual, consistent answers (good for study materials).
+    # Set max_output_tokens high enough to prevent truncation (like the MAX_TOKENS error you saw).
+    return types.GenerateContentConfig(
+        temperature=0.2,
+        max_output_tokens=4096,  # Plenty of room for a detailed answer
+        # the HTTP call itself must end within the budget, not only the retry window
+        http_options=types.HttpOptions(timeout=max(1, int(timeout_s * 1000))),
+    )
+
+def _generate_one(prompt_text, timeout_s=_RETRY_TIMEOUT):
+    """One upstream call. Returns (text, complete) where complete means finish_reason STOP."""
+    # Retries must not outlive the request's remaining latency budget.
+    s = current_span()
+    window = min(_RETRY_TIMEOUT, timeout_s)
+    deadline = time.monotonic() + window
+
+    def attempt():
+        # every attempt, retries included, only gets what is left of the budget
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("LLM budget exhausted")
+        return _generate_content(_get_client(), prompt_text, _generation_config(remaining))
+
+    call = _RETRY.with_timeout(window)(attempt, on_error=lambda e: s.incr("retries"))
+    response = call()
+    finish = response.candidates[0].finish_reason.name if response.candidates else "NONE"
+    s.set(finish_reason=finish)
+    # Check if the generation stopped early due to MAX_TOKENS
+    if finish == "MAX_TOKENS":
+        log.warning("Gemini response was cut off; consider raising max_output_tokens.")
+    complete = finish == "STOP"
+    # Google sometimes returns lists; make it safe:
+    return extract_gemini_text(response), complete
+
+# Optional micro-batching (LLM_BATCH_WINDOW_MS > 0 and LLM_BATCH_URL set):
+# concurrent prompts are collected for a few ms and sent together to the batch
+# endpoint. Gemini itself takes one prompt per call, so without an endpoint
+# there is nothing to batch and calls go straight to the shared client.
+_batcher = None
+if LLM_BATCH_WINDOW_MS > 0 and LLM_BATCH_URL:
+    _batcher = MicroBatcher(
+        HttpBatchBackend(LLM_BATCH_URL),
+        window_ms=LLM_BATCH_WINDOW_MS,
+        max_batch=LLM_BATCH_MAX,
+    )
+
+def admission_stats() -> dict:
+    stats = _admission.stats()
+    if _batcher is not None:
+        stats["batching"] = _batcher.stats()
+    return stats
+
+def prompt_cache_stats() -> dict:
+    return _prompt_cache.stats()
+
 # 1. SET YOUR API KEY
 # It is best practice to set your API key as an Environment Variable (GEMINI_API_KEY).
 # The client will automatically pick it up.
 # e.g., in your terminal: export GEMINI_API_KEY="YOUR_API_KEY_HERE"
 
-def gemini_generate(prompt_text):
-    """Generates content using gemini-2.5-flash with specific settings."""
-    if not GEMINI_API_KEY:
-        return _fallback_content(), _fallback_rationale()
-    try:
-        # Initialize the client. The API key is read from the environment.
-        client = genai.Client(api_key=GEMINI_API_KEY)
-
-        # 2. OPTIMIZE THE GENERATION CONFIG
-        # Set a low temperature for factual, consistent answers (good for study materials).
-        # Set max_output_tokens high enough to prevent truncation (like the MAX_TOKENS error you saw).
-        config = types.GenerateContentConfig(
-            temperature=0.2,
-            max_output_tokens=4096  # Plenty of room for a detailed answer
+def gemini_generate(prompt_text, priority=PRIORITY_CONTENT, budget_s=None, cache_scope=None,
+                    fallback_content=None):
+    """
+    Generates content using gemini-2.5-flash with specific settings.
+    The call goes through admission control; when it cannot finish within
+    budget_s (default per priority) the fallback is returned immediately.
+    With cache_scope set, a cached answer to a near-duplicate prompt in the
+    same scope is returned without calling the API. fallback_content (e.g.
+    the domain's primer fallback) replaces the generic fallback text.
+    """
+    with span("gemini_generate", kind="client", priority=priority, cache_hit=False) as s:
+        if cache_scope is not None:
+            cached = _prompt_cache.get(cache_scope, prompt_text)
+            if cached is not None:
+                s.set(cache_hit=True)
+                return cached
+        if not GEMINI_API_KEY:
+            return _fallback("no_api_key", fallback_content)
+        if budget_s is None:
+            budget_s = _BUDGETS.get(priority, LLM_BUDGET_CONTENT_S)
+        s.set(budget_s=budget_s, batched=_batcher is not None)
+        return _admission.run(
+            lambda remaining: _gemini_call(prompt_text, remaining, cache_scope, fallback_content),
+            priority=priority,
+            budget_s=budget_s,
+            fallback=lambda: _fallback("admission_shed", fallback_content),
         )
 
-        # 3. CALL THE API
-        response = _generate_content_with_retry(client, prompt_text, config)
-        # Check if the generation stopped early due to MAX_TOKENS
-        if response.candidates and response.candidates[0].finish_reason.name == "MAX_TOKENS":
-            print("⚠️ WARNING: The response was cut off. Try increasing max_output_tokens.")
+def _fallback(reason, content=None):
+    current_span().set(fallback=reason)
+    return content or _fallback_content(), _fallback_rationale()
 
 
-        # Google sometimes returns lists; make it safe:
-        return extract_gemini_text(response)
+def _gemini_call(prompt_text, remaining_s, cache_scope=None, fallback_content=None):
+    try:
+        if _batcher is not None:
+            fut = _batcher.submit(prompt_text, deadline=time.monotonic() + remaining_s)
+            try:
+                text, complete = fut.result(timeout=remaining_s), True
+            except FuturesTimeout:
+                fut.cancel()    # not dispatched yet: drop it instead of sending it upstream
+                raise
+        else:
+            text, complete = _generate_one(prompt_text, remaining_s)
+
+        # only complete answers are worth reusing
+        if cache_scope is not None and complete:
+            _prompt_cache.put(cache_scope, prompt_text, text)
+        return text
 
     except ServiceUnavailable as e:
             # This only runs if ALL retries failed (e.g., 60 seconds passed)
-        print(f"Gemini error: {e}. All retries failed.")
-        return _fallback_content(), _fallback_rationale()
+        log.warning("Gemini error: %s. All retries failed.", e)
+        current_span().set(error=str(e))
+        return _fallback("retries_exhausted", fallback_content)
 
     except Exception as e:
-        print(f"Gemini error: {e}")
-        return _fallback_content(), _fallback_rationale()
+        log.warning("Gemini error: %s", e)
+        current_span().set(error=f"{type(e).__name__}: {e}")
+        return _fallback("error", fallback_content)
 
 
 def extract_gemini_text(response):
@@ -85,13 +214,13 @@ def extract_gemini_text(response):
         return "Model did not generate text (e.g., a tool/function call was suggested)."
 
 def _fallback_content() -> str:
+    # domain-neutral; a domain's own text comes from its primer (see core.loaders)
     return (
-        "## Your Launchpad for DSA\n\n"
-        "- Know one programming language (variables, loops, if/else, functions)\n"
-        "- Refresh basic arithmetic & logic\n"
-        "- Understand what Big-O means (growth with input size)\n"
+        "## Getting Started\n\n"
+        "- Review the basics this topic builds on\n"
+        "- Work through one small example at a time\n"
         "- Practice breaking problems into clear steps\n\n"
-        "You can start with **Big-O (Time Complexity)** or review **Algorithmic Vocabulary**."
+        "You can start with the first topic or take the diagnostic to personalize your path."
     )
 
 def _fallback_rationale() -> str:
@@ -1,8 +1,12 @@
 import os
 import json
+import logging
 import google.generativeai as genai
 
 from core.settings import GEMINI_API_KEY
+from core.tracing import span, current_span
+
+log = logging.getLogger(__name__)
 
 genai.configure(api_key=GEMINI_API_KEY)
 
@@ -24,7 +28,12 @@ def gemini_primer_with_rationale(topic_prompt: str) -> tuple[str, str]:
     Ask Gemini to return a primer (markdown) and a one-line rationale.
     Falls back to deterministic text when API is missing/limited.
     """
+    with span("gemini_primer_with_rationale", kind="client", cache_hit=False):
+        return _primer_with_rationale(topic_prompt)
+
+def _primer_with_rationale(topic_prompt: str) -> tuple[str, str]:
     if not GEMINI_API_KEY:
+        current_span().set(fallback="no_api_key")
         return _fallback_content(), _fallback_rationale()
 
     try:
@@ -46,9 +55,10 @@ def gemini_primer_with_rationale(topic_prompt: str) -> tuple[str, str]:
             # Don't force JSON mime type; when the model can't comply it returns no parts.
             generation_config={"max_output_tokens": 700, "temperature": 0.3},
         )
-        print("Gemini response:", resp)
         raw = _first_text(resp)
+        current_span().set(response_chars=len(raw))
         if not raw:
+            current_span().set(fallback="empty_response")
             return _fallback_content(), _fallback_rationale()
 
         # Prefer JSON if present; otherwise treat whole text as markdown content
@@ -69,8 +79,8 @@ def gemini_primer_with_rationale(topic_prompt: str) -> tuple[str, str]:
         return content, rationale
 
     except Exception as e:
-        # Optional: log e for debugging
-        print(f"Gemini error: {e}")
+        log.warning("Gemini error: %s", e)
+        current_span().set(fallback="error", error=f"{type(e).__name__}: {e}")
         return _fallback_content(), _fallback_rationale()
 
 
@@ -1,29 +1,195 @@
 # core/loaders.py
-from functools import lru_cache
-import yaml
+"""
+Curriculum content, one bundle per domain: data/<domain>/{skill_graph,questions,explanations}.yaml.
+
+Bundles are loaded on first use and kept in an LRU bounded by an estimated
+memory budget (DOMAIN_CACHE_MAX_MB), so a node can serve many domains without
+loading them all at startup. Anything derived from a bundle (answer keys,
+compiled templates, ...) is memoized on the bundle, counts toward its size
+and is evicted with it.
+"""
+import hashlib
+import re
+import sys
+import threading
+import types
+from collections import OrderedDict
 from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import yaml
+
+from core.settings import DEFAULT_DOMAIN, DOMAIN_CACHE_MAX_MB
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+_DOMAIN_NAME = re.compile(r"^[a-z0-9][a-z0-9_.-]*$")
+_FILES = ("skill_graph.yaml", "questions.yaml", "explanations.yaml")
+
+class UnknownDomain(KeyError):
+    pass
 
-@lru_cache(maxsize=1)
-def load_skill_graph():
-    with open(DATA_DIR / "skill_graph.yaml", "r", encoding="utf-8") as f:
-        y = yaml.safe_load(f)
+def _deep_size(obj, seen=None) -> int:
+    """Rough recursive sys.getsizeof, good enough for a cache budget; ids in `seen` are skipped."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(v, seen) for v in obj)
+    elif isinstance(obj, types.FunctionType):
+        size += _deep_size(obj.__code__, seen)
+    elif isinstance(obj, types.CodeType):
+        size += _deep_size(obj.co_code, seen) + _deep_size(obj.co_consts, seen)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, (type, types.ModuleType)):
+        size += _deep_size(vars(obj), seen)
+    return size
+
+class DomainBundle:
+    def __init__(self, name: str, skill_graph: Dict, questions: Dict, templates: Dict, version: str,
+                 primer: Optional[Dict] = None):
+        self.name = name
+        self.skill_graph = skill_graph
+        self.questions = questions
+        self.templates = templates
+        # {"prompt": str, "fallback": markdown, "options": [{label, node, text}]}
+        self.primer = {**_default_primer(name), **(primer or {})}
+        self.version = version          # content hash; changes whenever any file changes
+        self.size = _deep_size([skill_graph, questions, templates, self.primer])
+        self._memo: Dict[Hashable, Any] = {}
+        self._grew: Optional[Callable[["DomainBundle", int], None]] = None   # set by the owning registry
+
+    def memo(self, key: Hashable, build: Callable[[], Any],
+             sizeof: Callable[[Any], int] = _deep_size) -> Any:
+        """Derived data cached for the lifetime of this bundle (and counted in its size)."""
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        built = build()
+        value = self._memo.setdefault(key, built)
+        if value is built:              # lost races are not charged
+            n = sizeof(built)
+            if self._grew is not None:
+                self._grew(self, n)
+            else:
+                self.size += n
+        return value
+
+def _default_primer(domain: str) -> Dict:
+    return {
+        "prompt": (f"Explain the prerequisites for learning {domain} in simple terms. "
+                   "Keep it friendly, structured, and concise."),
+        # shown when the LLM is unavailable
+        "fallback": (f"## Getting Started with {domain}\n\n"
+                     "- Review the basics it builds on\n"
+                     "- Work through one small example at a time\n\n"
+                     "Start with the first topic, or take the diagnostic to personalize your path."),
+        "options": [],
+    }
+
+def _compile_skill_graph(y: Dict) -> Dict:
     skills = {s["id"]: s for s in y["skills"]}
     prerequisites = {sid: skills[sid].get("prerequisites", []) for sid in skills}
-    return {"skills": skills, "prerequisites": prerequisites}
+    # reverse edges: skill -> [skills that list it as a prerequisite]
+    dependents = {sid: [] for sid in skills}
+    for sid, reqs in prerequisites.items():
+        for p in reqs:
+            dependents.setdefault(p, []).append(sid)
+    # where a fresh learner starts: the first skill without prerequisites
+    entry = next((sid for sid in skills if not prerequisites[sid]), next(iter(skills), None))
+    return {"skills": skills, "prerequisites": prerequisites, "dependents": dependents, "entry": entry}
 
-@lru_cache(maxsize=1)
-def load_questions():
-    with open(DATA_DIR / "questions.yaml", "r", encoding="utf-8") as f:
-        y = yaml.safe_load(f)
+def _compile_questions(y: Dict) -> Dict:
     by_skill = {}
     for q in y["questions"]:
         by_skill.setdefault(q["skill"], []).append(q)
-    return {"all": y["questions"], "by_skill": by_skill}
+    return {"all": y["questions"], "by_skill": by_skill, "by_id": {q["id"]: q for q in y["questions"]}}
+
+def _read_bundle(domain: str) -> DomainBundle:
+    root = DATA_DIR / domain
+    if not _DOMAIN_NAME.match(domain) or not all((root / f).is_file() for f in _FILES):
+        raise UnknownDomain(domain)
+    raw = {}
+    h = hashlib.sha1()
+    for f in _FILES:
+        data = (root / f).read_bytes()
+        h.update(data)
+        raw[f] = yaml.safe_load(data)
+    return DomainBundle(
+        domain,
+        _compile_skill_graph(raw["skill_graph.yaml"]),
+        _compile_questions(raw["questions.yaml"]),
+        raw["explanations.yaml"]["templates"],
+        h.hexdigest()[:12],
+        raw["explanations.yaml"].get("primer"),
+    )
+
+class DomainRegistry:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._bundles: "OrderedDict[str, DomainBundle]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.loads = self.evictions = 0
+
+    def get(self, domain: str) -> DomainBundle:
+        with self._lock:
+            b = self._bundles.get(domain)
+            if b is not None:
+                self._bundles.move_to_end(domain)
+                return b
+        b = _read_bundle(domain)             # parse outside the lock
+        with self._lock:
+            if domain in self._bundles:      # another thread won the race
+                self._bundles.move_to_end(domain)
+                return self._bundles[domain]
+            self._bundles[domain] = b
+            self._bytes += b.size
+            b._grew = self._grew
+            self.loads += 1
+            self._evict()
+            return b
+
+    def _grew(self, b: DomainBundle, n: int):
+        with self._lock:
+            b.size += n
+            if self._bundles.get(b.name) is b:
+                self._bytes += n
+                self._evict()
+
+    def _evict(self):
+        # always keep the most recent bundle, even if it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._bundles) > 1:
+            _, old = self._bundles.popitem(last=False)
+            self._bytes -= old.size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._bundles.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"loaded": list(self._bundles), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "loads": self.loads, "evictions": self.evictions}
+
+registry = DomainRegistry(int(DOMAIN_CACHE_MAX_MB * 1024 * 1024))
+
+def available_domains() -> List[str]:
+    return sorted(p.name for p in DATA_DIR.iterdir() if p.is_dir() and (p / _FILES[0]).is_file())
+
+def load_domain(domain: Optional[str] = None) -> DomainBundle:
+    return registry.get(domain or DEFAULT_DOMAIN)
+
+def load_skill_graph(domain: Optional[str] = None):
+    return load_domain(domain).skill_graph
+
+def load_questions(domain: Optional[str] = None):
+    return load_domain(domain).questions
 
-@lru_cache(maxsize=1)
-def load_templates():
-    with open(DATA_DIR / "explanations.yaml", "r", encoding="utf-8") as f:
-        y = yaml.safe_load(f)
-    return y["templates"]
+def load_templates(domain: Optional[str] = None):
+    return load_domain(domain).templates
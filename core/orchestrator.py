@@ -1,21 +1,32 @@
 # core/orchestrator.py
 from typing import Dict, Any
-from core.loaders import load_skill_graph, load_questions
-from core.state import get_state, update_score
+from core.loaders import load_questions, load_domain
+from core.state import get_state, update_score, frontier_for, state_key
 from core.policy import decide_next, SkillScore
 from core.templating import render, titles_for
+from core.grading import answer_key, normalize_answer
 from core.state import save_state  # add at top
 from core.llm_gemini import gemini_generate
+from core.admission import PRIORITY_PRIMER, PRIORITY_CONTENT
+from core import analytics
+from core.tracing import traced, current_span
+from core.decision_cache import DecisionCache, fingerprint
+from core.settings import DECISION_CACHE_MAX_ENTRIES
 
+_decisions = DecisionCache(DECISION_CACHE_MAX_ENTRIES)
 
-def _pending_items_in_node(state, node_id) -> int:
-    q_by_skill = load_questions()["by_skill"]
+def decision_cache_stats() -> dict:
+    return _decisions.stats()
+
+
+def _pending_items_in_node(state, node_id, domain=None) -> int:
+    q_by_skill = load_questions(domain)["by_skill"]
     asked = state.pending_index_per_node.get(node_id, 0)
     total = len(q_by_skill.get(node_id, []))
     return max(total - asked, 0)
 
-def _next_question(state, node_id) -> Dict[str, Any]:
-    q_by_skill = load_questions()["by_skill"]
+def _next_question(state, node_id, domain=None) -> Dict[str, Any]:
+    q_by_skill = load_questions(domain)["by_skill"]
     idx = state.pending_index_per_node.get(node_id, 0)
     items = q_by_skill.get(node_id, [])
 
@@ -57,10 +68,59 @@ def _result(
     }
 
 
-def handle_event(session_id: str, user_message: str | None, action: str | None) -> Dict[str, Any]:
-    sg = load_skill_graph()
+def _rationale(decision, domain=None) -> str:
+    """Rationale text for a Decision; depends only on the decision (cached with it)."""
+    ids = set()
+    if decision.next_node:
+        ids.add(decision.next_node)
+    if decision.from_node:
+        ids.add(decision.from_node)
+    titles = titles_for(ids, domain)
+
+    ev = decision.evidence or {}
+    ctx = {
+        **ev,
+        "skill_title": titles.get(decision.next_node, ""),
+        "from_title": titles.get(decision.from_node, ""),
+        "next_title": titles.get(decision.next_node, ""),
+        "threshold": ev.get("threshold", 2),
+        "confidence": decision.confidence,
+    }
+
+    if decision.action == "OFFER_DIAGNOSTIC":
+        return render("offer_diagnostic", ctx, domain)
+    if decision.action == "ASK_QUESTION":
+        return render("ask_question_intro", {"skill_title": titles.get(decision.next_node, "")}, domain)
+    if decision.action == "REVIEW_PREREQ":
+        base = render("review_prereq", ctx, domain)
+        # add a short counterfactual line (optional)
+        try:
+            return base + " " + render("review_prereq_counterfactual", ctx, domain)
+        except Exception:
+            return base
+    if decision.action == "ADVANCE":
+        return render("advance", ctx, domain)
+    if decision.action == "ANSWER_CONTENT":
+        return render("answer_content_note", {"topic": titles.get(decision.next_node, "this topic")}, domain)
+    return ""
+
+
+@traced("handle_event")
+def handle_event(
+    session_id: str,
+    user_message: str | None,
+    action: str | None,
+    domain: str | None = None,
+) -> Dict[str, Any]:
+    bundle = load_domain(domain)
+    sg = bundle.skill_graph
     prereqs = sg["prerequisites"]
+    # progress is per domain: another domain's request never touches this one's state
+    session_id = state_key(session_id, domain)
     state = get_state(session_id)
+    # a fresh state (or a node dropped from the skill graph) starts at the entry skill
+    if state.current_node not in sg["skills"] and sg["entry"]:
+        state.current_node = sg["entry"]
 
     # --- Handle explicit Diagnostic choices from UI (short-circuit the policy) ---
     if action == "continue" and user_message:
@@ -69,15 +129,16 @@ def handle_event(session_id: str, user_message: str | None, action: str | None)
         # Diagnostic: Yes → start questions on the first prereq
         if msg in ("diagnostic: yes", "diagnostic_yes", "yes"):
             state.skipped_diagnostic = False
-            q = _next_question(state, "prereq.math.basics")
+            entry = sg["entry"]
+            q = _next_question(state, entry, domain)
             save_state(session_id, state)
             return {
                 "action": "ASK_QUESTION",
-                "next_node": "prereq.math.basics",
+                "next_node": entry,
                 "from_node": None,
                 "confidence": "medium",
                 "ui": {
-                    "rationale": render("ask_question_intro", {"skill_title": "Math Basics"}),
+                    "rationale": render("ask_question_intro", {"skill_title": titles_for([entry], domain).get(entry, "")}, domain),
                     "question": q,
                     "options": []
                 }
@@ -88,50 +149,32 @@ def handle_event(session_id: str, user_message: str | None, action: str | None)
             state.skipped_diagnostic = True
             save_state(session_id, state)
 
-            content_md = gemini_generate(
-                "Explain the prerequisites for learning Data Structures and Algorithms "
-                "in simple terms. Focus on Big-O intuition, core vocabulary, and how to "
-                "approach problem solving. Keep it friendly, structured, and concise."
-            )
+            primer = bundle.primer
+            content_md = gemini_generate(primer["prompt"], priority=PRIORITY_PRIMER,
+                                         fallback_content=primer["fallback"])
 
             return _result(
             "ANSWER_CONTENT",
             content=content_md,         # main teaching text
             rationale="Some test rationale",   # short Why? (optional; UI can hide if empty)
-            options=[
-                "Start with Big-O",
-                "Review Algorithmic Vocabulary",
-                "Take Diagnostic Later",
-            ],
-            next_node="prereq.math.basics",
+            options=[o["label"] for o in primer["options"]] + ["Take Diagnostic Later"],
+            next_node=sg["entry"],
         )
 
-        # Optional follow-ups after skipping diagnostic (content-only)
-        if msg == "start with big-o":
-            return {
-                "action": "ANSWER_CONTENT",
-                "next_node": "core.bigO.time",
-                "from_node": None,
-                "confidence": "medium",
-                "ui": {
-                    "rationale": "Here’s a concise overview of Time Complexity (Big-O):\n• Big-O is an upper bound on growth...\n• Common classes: O(1), O(log n), O(n), O(n log n), O(n²)\n• Use it to reason about scalability.\n\nAsk for examples or say ‘give me a quick exercise’.",
-                    "question": None,
-                    "options": []
+        # Optional follow-ups after skipping diagnostic (content-only), from the domain's primer
+        for opt in bundle.primer["options"]:
+            if msg == opt["label"].strip().lower():
+                return {
+                    "action": "ANSWER_CONTENT",
+                    "next_node": opt.get("node"),
+                    "from_node": None,
+                    "confidence": "medium",
+                    "ui": {
+                        "rationale": opt.get("text", ""),
+                        "question": None,
+                        "options": []
+                    }
                 }
-            }
-
-        if msg == "review algorithmic vocabulary":
-            return {
-                "action": "ANSWER_CONTENT",
-                "next_node": "prereq.algorithms.vocab",
-                "from_node": None,
-                "confidence": "medium",
-                "ui": {
-                    "rationale": "Key terms you’ll see:\n• Input size n, operation count, worst/average case, complexity class\n• Stable/unstable sorting, in-place vs. extra space\n\nSay ‘continue’ for more or ‘examples’ to see usage.",
-                    "question": None,
-                    "options": []
-                }
-            }
 
         if msg == "take diagnostic later":
             return {
@@ -151,7 +194,10 @@ def handle_event(session_id: str, user_message: str | None, action: str | None)
     if action == "content_only":
         intent = "CONTENT_ONLY"
         content_md = gemini_generate(
-                user_message
+                user_message,
+                priority=PRIORITY_CONTENT,
+                cache_scope=f"{bundle.name}:{state.current_node}",
+                fallback_content=bundle.primer["fallback"],
             )
 
         return _result(
@@ -161,75 +207,50 @@ def handle_event(session_id: str, user_message: str | None, action: str | None)
             options=[
 
             ],
-            next_node="prereq.math.basics",
-            from_node= "core.bigO.time",
+            next_node=sg["entry"],
+            from_node=state.current_node,   # the skill the learner asked from
         )
     elif action == "start" or user_message:
         intent = "START" if action == "start" else "CONTINUE"
     else:
         intent = "CONTINUE"
 
-    pending = _pending_items_in_node(state, state.current_node)
-
-    decision = decide_next(
-        intent=intent,
-        current_node=state.current_node,
-        scores=state.scores,
-        prerequisites=prereqs,
-        pending_items_in_node=pending,
-        skipped_diagnostic=state.skipped_diagnostic
-    )
+    pending = _pending_items_in_node(state, state.current_node, domain)
 
-    # Build rationale context
-    ids = set()
-    if decision.next_node:
-        ids.add(decision.next_node)
-    if decision.from_node:
-        ids.add(decision.from_node)
-    titles = titles_for(ids)
-
-    ev = decision.evidence or {}
-    ctx = {
-        **ev,
-        "skill_title": titles.get(decision.next_node, ""),
-        "from_title": titles.get(decision.from_node, ""),
-        "next_title": titles.get(decision.next_node, ""),
-        "threshold": ev.get("threshold", 2),
-        "confidence": decision.confidence,
-    }
+    fp = fingerprint(intent, state.current_node, state.scores, prereqs, pending, state.skipped_diagnostic)
+    hit = _decisions.get(bundle.name, bundle.version, fp)
+    if hit is not None:
+        decision, rationale = hit
+    else:
+        decision = decide_next(
+            intent=intent,
+            current_node=state.current_node,
+            scores=state.scores,
+            prerequisites=prereqs,
+            pending_items_in_node=pending,
+            skipped_diagnostic=state.skipped_diagnostic,
+            frontier=frontier_for(state, domain, session_id),
+        )
+        rationale = _rationale(decision, domain)
+        _decisions.put(bundle.name, bundle.version, fp, (decision, rationale))
+    analytics.on_decision(decision.action)
+    current_span().set(intent=intent, decision=decision.action, decision_cache_hit=hit is not None)
 
     # Action handling
-    ui: Dict[str, Any] = {"rationale": "", "question": None, "options": []}
+    ui: Dict[str, Any] = {"rationale": rationale, "question": None, "options": []}
 
     if decision.action == "OFFER_DIAGNOSTIC":
-        ui["rationale"] = render("offer_diagnostic", ctx)
         ui["options"] = ["Diagnostic: Yes", "Diagnostic: No"]
 
     elif decision.action == "ASK_QUESTION":
-        q = _next_question(state, decision.next_node)
-        ui["rationale"] = render("ask_question_intro", {"skill_title": titles.get(decision.next_node, "")})
-        ui["question"] = q
+        ui["question"] = _next_question(state, decision.next_node, domain)
         save_state(session_id, state)
 
     elif decision.action == "REVIEW_PREREQ":
-        base = render("review_prereq", ctx)
-        # add a short counterfactual line (optional)
-        try:
-            cf = render("review_prereq_counterfactual", ctx)
-            ui["rationale"] = base + " " + cf
-        except Exception:
-            ui["rationale"] = base
         state.current_node = decision.next_node
         save_state(session_id, state)
 
-    elif decision.action == "ADVANCE":
-        ui["rationale"] = render("advance", ctx)
-        # move focus to the skill that follows the current one (if any)
-        # keep as-is for PoC; frontend can just highlight current_node
-
-    elif decision.action == "ANSWER_CONTENT":
-        topic_title = titles.get(decision.next_node, "this topic")
-        ui["rationale"] = render("answer_content_note", {"topic": topic_title})
+    # ADVANCE: keep current_node as-is for PoC; frontend can just highlight it
 
     return {
         "action": decision.action,
@@ -239,17 +260,20 @@ def handle_event(session_id: str, user_message: str | None, action: str | None)
         "ui": ui
     }
 
-def grade_answer(session_id: str, question_id: str, user_answer: str) -> Dict[str, Any]:
-    state = get_state(session_id)
+@traced("grade_answer")
+def grade_answer(session_id: str, question_id: str, user_answer: str, domain: str | None = None) -> Dict[str, Any]:
     # find question by id
-    all_q = load_questions()["all"]
-    q = next((x for x in all_q if x["id"] == question_id), None)
-    if not q:
+    k = answer_key(domain).get(question_id)
+    if not k:
         return {"error": "unknown_question"}
+    session_id = state_key(session_id, domain)
+    state = get_state(session_id)
+    expected, skill, raw_answer, total_for_node = k
 
-    correct = str(user_answer).strip() == str(q["answer"]).strip()
+    correct = normalize_answer(user_answer) == expected
+    current_span().set(question_id=question_id, skill=skill, correct=correct)
     # update score for skill
-    total_for_node = len(load_questions()["by_skill"].get(q["skill"], []))
-    update_score(state, q["skill"], correct, total_for_node)
-    save_state(session_id, state)
-    return {"correct": correct, "skill": q["skill"], "expected": q["answer"]}
+    update_score(state, skill, correct, total_for_node)
+    # a graded answer must not be lost: wait for the commit so a failed write surfaces
+    save_state(session_id, state).result()
+    return {"correct": correct, "skill": skill, "expected": raw_answer}
@@ -36,6 +36,65 @@ def is_ready(scores: Dict[str, SkillScore], node_id: str) -> bool:
     s = score_for_node(scores, node_id)
     return s.correct >= READY_THRESHOLD
 
+# ---- Readiness frontier ----
+class Frontier:
+    """
+    Per-learner index of ready skills and unlocked skills (every prerequisite ready).
+    Built once from the scores, then kept current by on_score_change(), which only
+    walks the dependents of the skill whose score moved.
+    """
+    __slots__ = ("ready", "unlocked", "_unmet", "_prerequisites", "_dependents")
+
+    def __init__(
+        self,
+        scores: Dict[str, SkillScore],
+        prerequisites: Dict[str, List[str]],
+        dependents: Dict[str, List[str]],
+    ):
+        self._prerequisites = prerequisites
+        self._dependents = dependents
+        self.ready = {n for n in scores if is_ready(scores, n)}
+        self.unlocked = set()
+        self._unmet: Dict[str, int] = {}     # skill -> number of prereqs not yet ready
+        for node, reqs in prerequisites.items():
+            missing = sum(1 for p in reqs if p not in self.ready)
+            self._unmet[node] = missing
+            if missing == 0:
+                self.unlocked.add(node)
+
+    def built_for(self, prerequisites: Dict[str, List[str]]) -> bool:
+        return self._prerequisites is prerequisites
+
+    def is_ready(self, node_id: str) -> bool:
+        return node_id in self.ready
+
+    def is_unlocked(self, node_id: str) -> bool:
+        # skills outside the graph have no prerequisites, same as decide_next()
+        return self._unmet.get(node_id, 0) == 0
+
+    def unmet(self, node_id: str) -> List[str]:
+        if self.is_unlocked(node_id):
+            return []
+        return [p for p in self._prerequisites.get(node_id, []) if p not in self.ready]
+
+    def on_score_change(self, scores: Dict[str, SkillScore], node_id: str) -> None:
+        now = is_ready(scores, node_id)
+        if now == (node_id in self.ready):
+            return
+        if now:
+            self.ready.add(node_id)
+            delta = -1
+        else:
+            self.ready.discard(node_id)
+            delta = 1
+        for dep in self._dependents.get(node_id, []):
+            missing = self._unmet.get(dep, 0) + delta
+            self._unmet[dep] = missing
+            if missing == 0:
+                self.unlocked.add(dep)
+            else:
+                self.unlocked.discard(dep)
+
 def confidence_from_signals(signals_count: int) -> Literal["low","medium","high"]:
     if signals_count >= 3:
         return "high"
@@ -50,7 +109,8 @@ def decide_next(
     scores: Dict[str, SkillScore],                        # per-skill scores
     prerequisites: Dict[str, List[str]],                  # skill -> [prereq ids]
     pending_items_in_node: int,                           # remaining questions for node
-    skipped_diagnostic: bool = False
+    skipped_diagnostic: bool = False,
+    frontier: Optional[Frontier] = None                   # precomputed readiness index
 ) -> Decision:
     """
     Deterministic tutoring policy:
@@ -59,6 +119,9 @@ def decide_next(
     3) If diagnostic in progress and items remain -> ASK_QUESTION.
     4) If node is ready -> ADVANCE; else REVIEW_PREREQ (or ASK_QUESTION if not enough evidence).
     5) If CONTENT_ONLY intent -> ANSWER_CONTENT, but add rationale about skipping diagnostic.
+
+    When a Frontier is passed, readiness is read from it instead of re-deriving
+    it from scores; it must have been built from the same scores/prerequisites.
     """
 
     # 1) Content-only request (e.g., "Explain Big-O") — answer, but be transparent.
@@ -72,10 +135,10 @@ def decide_next(
         return Decision(action="OFFER_DIAGNOSTIC", next_node=current_node, evidence=ev, confidence="medium")
 
     # 3) Enforce unmet prerequisites
-    unmet = []
-    for p in prerequisites.get(current_node, []):
-        if not is_ready(scores, p):
-            unmet.append(p)
+    if frontier is not None:
+        unmet = frontier.unmet(current_node)
+    else:
+        unmet = [p for p in prerequisites.get(current_node, []) if not is_ready(scores, p)]
 
     if unmet:
         # pick the first unmet prerequisite to review
@@ -97,7 +160,8 @@ def decide_next(
         return Decision(action="ASK_QUESTION", next_node=current_node, evidence=ev, confidence="high")
 
     # 5) Decide readiness for current node after available evidence
-    if is_ready(scores, current_node):
+    ready = frontier.is_ready(current_node) if frontier is not None else is_ready(scores, current_node)
+    if ready:
         ev = {
             "from_node": current_node,
             "score_correct": score_for_node(scores, current_node).correct,
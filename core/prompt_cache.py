@@ -0,0 +1,152 @@
+# core/prompt_cache.py
+"""
+Near-duplicate answer cache for free-form prompts.
+
+Prompts are normalized to content words, turned into a shingle set (words plus
+adjacent word pairs) and summarized with a MinHash signature. An LSH index over
+signature bands finds candidate entries in the same scope (skill node); the
+best candidate is reused when its exact Jaccard similarity reaches the
+threshold. Words that flip the meaning of a question (negations and
+comparatives such as "not", "faster", "than") must match exactly, so "when
+should I not use recursion" never reuses the answer to "when should I use
+recursion". Everything is in-process; entries are evicted LRU-first.
+"""
+import random
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Set, Tuple
+
+_MERSENNE = (1 << 61) - 1
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+    a an the is are was were be of to in on for and or with about me my i you your
+    what whats how why when which does do did can could would should please tell
+    explain describe define give show teach help understand mean means meaning
+""".split())
+
+# a cached answer is only reused when the prompts contain the same set of these
+_GUARDS = frozenset("""
+    not no never without cannot nor neither
+    than faster slower better worse more less fewer larger smaller bigger
+    higher lower best worst fastest slowest most least vs versus instead
+""".split())
+_NEGATED = re.compile(r"n't\b")
+
+def normalize(prompt: str) -> list:
+    """Lowercase content words; 'Big-O' and 'big O' both become ['big', 'o']."""
+    words = _WORD.findall(_NEGATED.sub(" not", prompt.lower()))
+    out = []
+    for w in words:
+        if w in _STOPWORDS:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]          # crude plural folding: "algorithms" -> "algorithm"
+        out.append(w)
+    return out
+
+def shingles(prompt: str) -> FrozenSet[str]:
+    words = normalize(prompt)
+    grams = set(words)
+    grams.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return frozenset(grams)
+
+def guards(prompt: str) -> FrozenSet[str]:
+    """Meaning-flipping words in the prompt; see _GUARDS."""
+    return frozenset(w for w in normalize(prompt) if w in _GUARDS)
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+class PromptCache:
+    def __init__(self, threshold: float = 0.8, max_entries: int = 10000,
+                 num_perm: int = 48, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_perm // bands
+        rnd = random.Random(seed)
+        self._perms = [(rnd.randrange(1, _MERSENNE), rnd.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+        # id -> (scope, shingles, band keys, answer, guard words)
+        self._entries: "OrderedDict[int, Tuple[str, FrozenSet[str], list, str, FrozenSet[str]]]" = OrderedDict()
+        self._buckets: Dict[tuple, Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def _band_keys(self, scope: str, sh: FrozenSet[str]) -> list:
+        hashed = [zlib.crc32(s.encode("utf-8")) for s in sh]
+        sig = [min((a * h + b) % _MERSENNE for h in hashed) for a, b in self._perms]
+        r = self.rows
+        return [(scope, i, tuple(sig[i * r:(i + 1) * r])) for i in range(self.bands)]
+
+    def _best(self, keys: list, sh: FrozenSet[str], gw: FrozenSet[str]) -> Tuple[Optional[int], float]:
+        candidates: Set[int] = set()
+        for k in keys:
+            candidates |= self._buckets.get(k, set())
+        best, best_sim = None, 0.0
+        for eid in candidates:
+            entry = self._entries[eid]
+            if entry[4] != gw:
+                continue
+            sim = jaccard(sh, entry[1])
+            if sim > best_sim:
+                best, best_sim = eid, sim
+        return best, best_sim
+
+    def get(self, scope: str, prompt: Optional[str]) -> Optional[str]:
+        sh = shingles(prompt or "")
+        if not sh:
+            return None
+        keys = self._band_keys(scope, sh)
+        gw = guards(prompt or "")
+        with self._lock:
+            eid, sim = self._best(keys, sh, gw)
+            if eid is None or sim < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(eid)
+            self.hits += 1
+            return self._entries[eid][3]
+
+    def put(self, scope: str, prompt: Optional[str], answer: str) -> None:
+        sh = shingles(prompt or "")
+        if not sh or self.max_entries <= 0:
+            return
+        keys = self._band_keys(scope, sh)
+        gw = guards(prompt or "")
+        with self._lock:
+            eid, sim = self._best(keys, sh, gw)
+            if eid is not None and sim == 1.0:
+                # same normalized prompt: refresh the answer in place
+                s, esh, ekeys, _, egw = self._entries[eid]
+                self._entries[eid] = (s, esh, ekeys, answer, egw)
+                self._entries.move_to_end(eid)
+                return
+            eid = self._next_id
+            self._next_id += 1
+            self._entries[eid] = (scope, sh, keys, answer, gw)
+            for k in keys:
+                self._buckets.setdefault(k, set()).add(eid)
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        eid, (_, _, keys, _, _) = self._entries.popitem(last=False)
+        for k in keys:
+            ids = self._buckets.get(k)
+            if ids is not None:
+                ids.discard(eid)
+                if not ids:
+                    del self._buckets[k]
+        self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}
@@ -10,8 +10,70 @@ def _bool(key: str, default: bool = False) -> bool:
         return default
     return v.lower() in ("1", "true", "yes", "on")
 
+def _int(key: str, default: int) -> int:
+    v = os.getenv(key)
+    return int(v) if v not in (None, "") else default
+
+def _float(key: str, default: float) -> float:
+    v = os.getenv(key)
+    return float(v) if v not in (None, "") else default
+
 USE_SQLITE = _bool("USE_SQLITE", False)
 DB_PATH = os.getenv("DB_PATH", "./xai_tutor.db")
 AUDIT_DIR = os.getenv("AUDIT_DIR", "./logs")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# curriculum bundles live in data/<domain>/; requests without a domain use this one
+DEFAULT_DOMAIN = os.getenv("DEFAULT_DOMAIN", "dsa")
+DOMAIN_CACHE_MAX_MB = _float("DOMAIN_CACHE_MAX_MB", 256.0)
 CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "").split(",") if o.strip()]
+
+# in-memory mode only: op log + periodic snapshots so restarts keep sessions
+USE_STATE_LOG = _bool("USE_STATE_LOG", False)
+STATE_LOG_DIR = os.getenv("STATE_LOG_DIR", "./state")
+STATE_SNAPSHOT_INTERVAL_S = _float("STATE_SNAPSHOT_INTERVAL_S", 300.0)
+STATE_SNAPSHOT_MIN_OPS = _int("STATE_SNAPSHOT_MIN_OPS", 100000)
+STATE_LOG_FSYNC = _bool("STATE_LOG_FSYNC", False)
+
+# learner_state hash shards (1 = everything in DB_PATH); change with `python -m core.db reshard`
+DB_SHARDS = _int("DB_SHARDS", 1)
+
+# SQLite group commit: max ops per transaction / max wait for a batch to fill
+DB_COMMIT_MAX_OPS = _int("DB_COMMIT_MAX_OPS", 256)
+DB_COMMIT_MAX_MS = _float("DB_COMMIT_MAX_MS", 2.0)
+
+# LLM admission control
+LLM_MAX_CONCURRENCY = _int("LLM_MAX_CONCURRENCY", 8)   # upstream calls in flight
+LLM_MAX_QUEUE = _int("LLM_MAX_QUEUE", 32)              # waiting calls before shedding
+LLM_RATE_PER_S = _float("LLM_RATE_PER_S", 5.0)         # upstream rate limit (0 = unlimited)
+LLM_BURST = _float("LLM_BURST", 10.0)
+LLM_BUDGET_PRIMER_S = _float("LLM_BUDGET_PRIMER_S", 20.0)
+LLM_BUDGET_CONTENT_S = _float("LLM_BUDGET_CONTENT_S", 10.0)
+
+# LLM micro-batching (0 = off): collect prompts for this many ms, up to LLM_BATCH_MAX
+LLM_BATCH_WINDOW_MS = _float("LLM_BATCH_WINDOW_MS", 0.0)
+LLM_BATCH_MAX = _int("LLM_BATCH_MAX", 16)
+LLM_BATCH_URL = os.getenv("LLM_BATCH_URL", "")   # batch endpoint; batching stays off without one
+
+# content_only near-duplicate prompt cache (MinHash/LSH)
+PROMPT_CACHE_THRESHOLD = _float("PROMPT_CACHE_THRESHOLD", 0.8)   # min Jaccard similarity
+PROMPT_CACHE_MAX_ENTRIES = _int("PROMPT_CACHE_MAX_ENTRIES", 10000)
+
+# memoized policy decisions + rationale text (0 disables)
+DECISION_CACHE_MAX_ENTRIES = _int("DECISION_CACHE_MAX_ENTRIES", 50000)
+
+# bulk export: rows per DB page / output chunk
+EXPORT_CHUNK_ROWS = _int("EXPORT_CHUNK_ROWS", 1000)
+
+# bulk grading: answers per chunk (one state load/save round per chunk)
+GRADE_CHUNK_ROWS = _int("GRADE_CHUNK_ROWS", 20000)
+
+# /session/ws: persist a held session this long after its last change (and on disconnect)
+WS_PERSIST_DEBOUNCE_MS = _int("WS_PERSIST_DEBOUNCE_MS", 500)
+
+# tracing: fraction of traces recorded (0 = off; an incoming sampled traceparent is always honored)
+TRACE_SAMPLE_RATE = _float("TRACE_SAMPLE_RATE", 0.0)
+TRACE_FILE = os.getenv("TRACE_FILE", "./logs/traces.jsonl")
+TRACE_FORMAT = os.getenv("TRACE_FORMAT", "jsonl")   # jsonl | otlp
+TRACE_BATCH_SIZE = _int("TRACE_BATCH_SIZE", 256)
+TRACE_FLUSH_MS = _int("TRACE_FLUSH_MS", 1000)
+TRACE_MAX_QUEUE = _int("TRACE_MAX_QUEUE", 10000)
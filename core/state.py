@@ -1,11 +1,17 @@
 # core/state.py
-from typing import Dict
+from typing import Dict, List, Optional
 from dataclasses import dataclass, field, asdict
+from concurrent.futures import Future
+import gc
 import json
+import threading
 
-from core.policy import SkillScore
+from core.policy import SkillScore, Frontier
+from core.loaders import load_skill_graph
 from core.config import USE_SQLITE
+from core.settings import DEFAULT_DOMAIN
 from core import db as dbmod  # only used if USE_SQLITE
+from core import analytics
 
 @dataclass
 class LearnerState:
@@ -13,9 +19,26 @@ class LearnerState:
     skipped_diagnostic: bool = False
     scores: Dict[str, SkillScore] = field(default_factory=dict)
     pending_index_per_node: Dict[str, int] = field(default_factory=dict)
+    # derived from scores; never persisted, built lazily by frontier_for() for long-lived states
+    frontier: Optional[Frontier] = field(default=None, repr=False, compare=False)
 
 # -------- In-memory fallback --------
 _STORE: Dict[str, LearnerState] = {}
+_LOG = None  # optional core.statelog.StateLog, see enable_state_log()
+
+# -------- Held ("hot") sessions --------
+# A live connection (e.g. /session/ws) pins its session here: get_state() returns
+# the pinned object and save_state() only marks it dirty; flush_held() writes it.
+class _Held:
+    __slots__ = ("state", "refs", "dirty")
+
+    def __init__(self, state: "LearnerState"):
+        self.state = state
+        self.refs = 0
+        self.dirty = False
+
+_HELD: Dict[str, _Held] = {}
+_HELD_LOCK = threading.Lock()
 
 def _state_to_serializable_dict(state: LearnerState) -> Dict:
     # convert SkillScore to plain dicts
@@ -37,10 +60,20 @@ def _state_from_serializable_dict(d: Dict) -> LearnerState:
         pending_index_per_node=pending,
     )
 
+def state_key(session_id: str, domain: Optional[str] = None) -> str:
+    """Storage key of a session's state in one domain; the default domain keeps the bare id."""
+    if not domain or domain == DEFAULT_DOMAIN:
+        return session_id
+    return f"{session_id}@{domain}"
+
 def get_state(session_id: str) -> LearnerState:
+    h = _HELD.get(session_id)
+    if h is not None:
+        return h.state
     if not USE_SQLITE:
         if session_id not in _STORE:
             _STORE[session_id] = LearnerState()
+            analytics.on_session_created()
         return _STORE[session_id]
 
     row = dbmod.load_state(session_id)
@@ -48,8 +81,37 @@ def get_state(session_id: str) -> LearnerState:
         st = LearnerState()
         # persist an initial row
         save_state(session_id, st)
+        analytics.on_session_created()
         return st
+    return _state_from_row(row)
+
+def get_states(session_ids) -> Dict[str, LearnerState]:
+    """
+    Batch get_state(). In SQLite mode rows are fetched with one query per
+    shard; unknown sessions start fresh and are written by the next save_states().
+    Held sessions come back as their held object, like get_state().
+    """
+    if not USE_SQLITE:
+        return {sid: get_state(sid) for sid in session_ids}
+    out = {}
+    ids = []
+    for sid in dict.fromkeys(session_ids):
+        h = _HELD.get(sid)
+        if h is not None:
+            out[sid] = h.state
+        else:
+            ids.append(sid)
+    rows = dbmod.load_states(ids) if ids else {}
+    for sid in ids:
+        row = rows.get(sid)
+        if row is None:
+            out[sid] = LearnerState()
+            analytics.on_session_created()
+        else:
+            out[sid] = _state_from_row(row)
+    return out
 
+def _state_from_row(row) -> LearnerState:
     _, skipped, current_node, scores_json, pending_json = row
     d = {
         "current_node": current_node,
@@ -59,12 +121,31 @@ def get_state(session_id: str) -> LearnerState:
     }
     return _state_from_serializable_dict(d)
 
-def save_state(session_id: str, state: LearnerState):
+def _done() -> Future:
+    fut: Future = Future()
+    fut.set_result(None)
+    return fut
+
+def save_state(session_id: str, state: LearnerState) -> Future:
+    """
+    Persist the state. In SQLite mode the write is queued on the group-commit
+    writer; call .result() on the returned Future to wait until it is durable.
+    Held sessions are only marked dirty; see flush_held().
+    """
+    h = _HELD.get(session_id)
+    if h is not None and h.state is state:
+        h.dirty = True
+        return _done()
+    return _persist(session_id, state)
+
+def _persist(session_id: str, state: LearnerState) -> Future:
     if not USE_SQLITE:
         _STORE[session_id] = state
-        return
+        if _LOG is not None:
+            _LOG.record_save(session_id, _state_to_serializable_dict(state))
+        return _done()
     d = _state_to_serializable_dict(state)
-    dbmod.save_state(
+    return dbmod.save_state(
         session_id=session_id,
         current_node=d["current_node"],
         skipped=d["skipped_diagnostic"],
@@ -72,16 +153,146 @@ def save_state(session_id: str, state: LearnerState):
         pending=d["pending"],
     )
 
+def save_states(states: Dict[str, LearnerState]) -> List[Future]:
+    """Batch save_state(); in SQLite mode one transaction per shard."""
+    if _HELD:
+        # held sessions are only marked dirty, as in save_state()
+        loose = {}
+        for sid, st in states.items():
+            h = _HELD.get(sid)
+            if h is not None and h.state is st:
+                h.dirty = True
+            else:
+                loose[sid] = st
+        states = loose
+    if not USE_SQLITE:
+        for sid, st in states.items():
+            _STORE[sid] = st
+            if _LOG is not None:
+                _LOG.record_save(sid, _state_to_serializable_dict(st))
+        return [_done()]
+    items = []
+    for sid, st in states.items():
+        d = _state_to_serializable_dict(st)
+        items.append((sid, d["current_node"], d["skipped_diagnostic"], d["scores"], d["pending"]))
+    return dbmod.save_states(items)
+
+def hold(session_id: str) -> LearnerState:
+    """Pin a session in memory until the matching release()."""
+    with _HELD_LOCK:
+        h = _HELD.get(session_id)
+        if h is None:
+            h = _HELD[session_id] = _Held(get_state(session_id))
+        h.refs += 1
+        return h.state
+
+def is_dirty(session_id: str) -> bool:
+    h = _HELD.get(session_id)
+    return h is not None and h.dirty
+
+def flush_held(session_id: str) -> Future:
+    """Persist a held session if it changed since the last flush."""
+    with _HELD_LOCK:
+        h = _HELD.get(session_id)
+        if h is None or not h.dirty:
+            return _done()
+        h.dirty = False
+        return _persist(session_id, h.state)
+
+def release(session_id: str) -> Future:
+    """Drop one pin and flush; the last pin also unpins the session."""
+    with _HELD_LOCK:
+        h = _HELD.get(session_id)
+        if h is None:
+            return _done()
+        h.refs -= 1
+        if h.refs <= 0:
+            del _HELD[session_id]
+        dirty, h.dirty = h.dirty, False
+        return _persist(session_id, h.state) if dirty else _done()
+
+def frontier_for(state: LearnerState, domain: Optional[str] = None,
+                 session_id: Optional[str] = None) -> Optional[Frontier]:
+    """
+    Ready/unlocked index for this learner, built on first use (and per skill graph).
+    Only states that outlive the request get one: in SQLite mode a state that is
+    not held was loaded for this call alone, and building costs O(graph), so
+    None is returned and decide_next() checks the node's prerequisites directly.
+    """
+    sg = load_skill_graph(domain)
+    if state.frontier is not None and state.frontier.built_for(sg["prerequisites"]):
+        return state.frontier
+    if USE_SQLITE:
+        h = _HELD.get(session_id) if session_id is not None else None
+        if h is None or h.state is not state:
+            return None
+    state.frontier = Frontier(state.scores, sg["prerequisites"], sg["dependents"])
+    return state.frontier
+
 def update_score(state: LearnerState, node: str, correct: bool, total_for_node: int):
-    sc = state.scores.get(node, SkillScore(0, 0))
-    if correct:
-        sc.correct += 1
+    apply_scores(state, node, 1, 1 if correct else 0, total_for_node)
+
+def apply_scores(state: LearnerState, node: str, answered: int, correct: int, total_for_node: int):
+    """update_score() for `answered` answers on one skill, `correct` of them right."""
+    before = state.scores.get(node)
+    before_correct = before.correct if before is not None else None
+    sc = before or SkillScore(0, 0)
+    sc.correct += correct
     sc.total = max(sc.total, total_for_node)
     state.scores[node] = sc
+    analytics.on_score(node, answered, correct, before_correct, sc.correct)
+    if state.frontier is not None:
+        state.frontier.on_score_change(state.scores, node)
 
-def reset_state(session_id: str):
+def reset_state(session_id: str) -> Future:
+    h = _HELD.get(session_id)
+    if h is not None:
+        # the connection keeps its pin but continues from a fresh state; the held
+        # copy (not the possibly stale stored one) is what the counters hold
+        analytics.on_session_reset(h.state.scores)
+        h.state, h.dirty = LearnerState(), True
+        analytics.on_session_created()
+        if not USE_SQLITE:
+            _STORE.pop(session_id, None)
+            if _LOG is not None:
+                _LOG.record_delete(session_id)
+            return _done()
+        return dbmod.delete_state(session_id)
     if not USE_SQLITE:
         if session_id in _STORE:
-            del _STORE[session_id]
-        return
-    dbmod.delete_state(session_id)
+            analytics.on_session_reset(_STORE.pop(session_id).scores)
+            if _LOG is not None:
+                _LOG.record_delete(session_id)
+        return _done()
+    row = dbmod.load_state(session_id)
+    if row is not None:
+        analytics.on_session_reset(_state_from_row(row).scores)
+    return dbmod.delete_state(session_id)
+
+def enable_state_log(log):
+    """
+    In-memory mode only: restore _STORE from the log's snapshot + tail, then
+    record every later save/reset in it.
+    """
+    global _LOG
+    recovered = log.recover()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for session_id, (node, skipped, scores, pending) in recovered.items():
+            _STORE[session_id] = LearnerState(
+                current_node=node,
+                skipped_diagnostic=skipped,
+                scores={k: SkillScore(c, t) for k, (c, t) in scores.items()},
+                pending_index_per_node=dict(pending),
+            )
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    # the counters are not in the log; derive them from what was restored
+    analytics.rebuild(
+        ({k: c for k, (c, _) in scores.items()}, pending)
+        for _, _, scores, pending in recovered.values()
+    )
+    log.start()
+    _LOG = log
@@ -0,0 +1,211 @@
+# core/statelog.py
+"""
+Durability for the in-memory session store (USE_STATE_LOG=1, USE_SQLITE=0).
+
+Every save/reset is handed to a background thread that appends it to an
+operation log (JSON lines, one segment per snapshot) and applies it to a
+shadow copy of the store. Periodically the shadow is written out as a compact
+pickle snapshot, after which older log segments and snapshots are deleted.
+On startup the newest readable snapshot is loaded and the log tail replayed.
+
+The request path only serializes the state and enqueues it, so latency stays
+at in-memory levels; the price is that the last few ms of ops can be lost on a
+crash (set STATE_LOG_FSYNC=1 to fsync every written batch).
+"""
+import atexit
+import gc
+import json
+import os
+import pickle
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_SNAP_PREFIX, _LOG_PREFIX = "snapshot-", "log-"
+
+def _pack(d: Dict) -> tuple:
+    """Serializable state dict -> compact tuple stored in snapshots."""
+    scores = {k: (v["correct"], v["total"]) for k, v in d["scores"].items()}
+    return (d["current_node"], d["skipped_diagnostic"], scores, dict(d["pending"]))
+
+def _unpack(t: tuple) -> Dict:
+    current_node, skipped, scores, pending = t
+    return {
+        "current_node": current_node,
+        "skipped_diagnostic": skipped,
+        "scores": {k: {"correct": c, "total": tot} for k, (c, tot) in scores.items()},
+        "pending": pending,
+    }
+
+class StateLog:
+    _STOP = object()
+
+    def __init__(self, directory: str, snapshot_interval_s: float = 300.0,
+                 snapshot_min_ops: int = 10000, fsync: bool = False):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.snapshot_interval_s = snapshot_interval_s
+        self.snapshot_min_ops = snapshot_min_ops
+        self.fsync = fsync
+        self._q: "queue.Queue" = queue.Queue()
+        self._shadow: Dict[str, tuple] = {}
+        self._seq = 0
+        self._thread: Optional[threading.Thread] = None
+        self._snap_thread: Optional[threading.Thread] = None
+
+    # ---- Files ----
+    def _files(self, prefix: str, suffix: str) -> List[Tuple[int, Path]]:
+        out = []
+        for p in self.dir.glob(f"{prefix}*{suffix}"):
+            try:
+                out.append((int(p.name[len(prefix):-len(suffix)]), p))
+            except ValueError:
+                continue
+        return sorted(out)
+
+    def _replay(self, after_seq: int) -> Iterator[dict]:
+        for _, path in self._files(_LOG_PREFIX, ".jsonl"):
+            with open(path, "r+b") as f:
+                good = 0             # end of the last complete record
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("no newline")
+                        rec = json.loads(line)
+                    except ValueError:
+                        # torn write at the tail of a segment: cut it off, or ops
+                        # appended after a restart would sit behind it and be lost
+                        f.truncate(good)
+                        break
+                    good += len(line)
+                    if rec["s"] > after_seq:
+                        yield rec
+
+    # ---- Recovery ----
+    def recover(self) -> Dict[str, tuple]:
+        """
+        Load the newest snapshot plus the log tail. Returns session_id ->
+        (current_node, skipped_diagnostic, {skill: (correct, total)}, pending);
+        callers must not mutate the returned tuples' dicts.
+        """
+        self._shadow, self._seq = {}, 0
+        # millions of small containers: cyclic GC passes would dominate load time
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for seq, path in reversed(self._files(_SNAP_PREFIX, ".bin")):
+                try:
+                    with open(path, "rb") as f:
+                        snap = pickle.load(f)
+                except Exception:
+                    continue         # unreadable snapshot: fall back to the previous one
+                self._shadow, self._seq = snap["states"], snap["seq"]
+                break
+            for rec in self._replay(self._seq):
+                if rec["op"] == "put":
+                    self._shadow[rec["id"]] = _pack(rec["d"])
+                else:
+                    self._shadow.pop(rec["id"], None)
+                self._seq = rec["s"]
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return dict(self._shadow)
+
+    # ---- Request path ----
+    def record_save(self, session_id: str, d: Dict):
+        self._q.put(("put", session_id, _pack(d)))
+
+    def record_delete(self, session_id: str):
+        self._q.put(("del", session_id, None))
+
+    # ---- Background writer ----
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="state-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._q.put(self._STOP)
+            self._thread.join()
+        if self._snap_thread is not None:
+            self._snap_thread.join()
+
+    def flush(self):
+        done = threading.Event()
+        self._q.put(done)
+        done.wait()
+
+    def _open_segment(self):
+        return open(self.dir / f"{_LOG_PREFIX}{self._seq + 1:020d}.jsonl", "a", encoding="utf-8")
+
+    def _run(self):
+        log = self._open_segment()
+        ops_since_snap, last_snap = 0, time.monotonic()
+        while True:
+            item = self._q.get()
+            batch = [item]
+            while True:              # drain whatever queued up meanwhile, one write per batch
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            lines, waiters, stop = [], [], False
+            for it in batch:
+                if it is self._STOP:
+                    stop = True
+                    continue
+                if isinstance(it, threading.Event):
+                    waiters.append(it)
+                    continue
+                op, sid, packed = it
+                self._seq += 1
+                if op == "put":
+                    self._shadow[sid] = packed
+                    lines.append(json.dumps({"s": self._seq, "op": op, "id": sid, "d": _unpack(packed)}))
+                else:
+                    self._shadow.pop(sid, None)
+                    lines.append(json.dumps({"s": self._seq, "op": op, "id": sid}))
+            if lines:
+                log.write("\n".join(lines) + "\n")
+                log.flush()
+                if self.fsync:
+                    os.fsync(log.fileno())
+                ops_since_snap += len(lines)
+            for w in waiters:
+                w.set()
+            if stop:
+                log.close()
+                return
+
+            due = time.monotonic() - last_snap >= self.snapshot_interval_s
+            if ops_since_snap and (ops_since_snap >= self.snapshot_min_ops or due):
+                if self._snap_thread is None or not self._snap_thread.is_alive():
+                    log.close()
+                    log = self._open_segment()   # new segment starts right after the snapshot seq
+                    # tuples are immutable, so a shallow copy is a consistent view at self._seq
+                    states, seq = dict(self._shadow), self._seq
+                    self._snap_thread = threading.Thread(
+                        target=self._write_snapshot, args=(states, seq), name="state-snapshot", daemon=True
+                    )
+                    self._snap_thread.start()
+                    ops_since_snap, last_snap = 0, time.monotonic()
+
+    def _write_snapshot(self, states: Dict[str, tuple], seq: int):
+        path = self.dir / f"{_SNAP_PREFIX}{seq:020d}.bin"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump({"seq": seq, "states": states}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        # segments that end at or before seq and older snapshots are no longer needed
+        for start, p in self._files(_LOG_PREFIX, ".jsonl"):
+            if start <= seq:
+                p.unlink(missing_ok=True)
+        for s, p in self._files(_SNAP_PREFIX, ".bin"):
+            if s < seq:
+                p.unlink(missing_ok=True)
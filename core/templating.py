@@ -1,11 +1,17 @@
 # core/templating.py
+from typing import Optional
 from jinja2 import Template
-from core.loaders import load_templates, load_skill_graph
+from core.loaders import load_domain, _deep_size
+from core.tracing import span
 
-def render(template_key: str, ctx: dict) -> str:
-    tpl = load_templates()[template_key]
-    return Template(tpl).render(**ctx)
+def render(template_key: str, ctx: dict, domain: Optional[str] = None) -> str:
+    with span("render", template=template_key):
+        b = load_domain(domain)
+        # the jinja environment is shared by every template, so it is not charged to the bundle
+        tpl = b.memo(("template", template_key), lambda: Template(b.templates[template_key]),
+                     sizeof=lambda t: _deep_size(t, {id(t.environment), id(t.globals)}))
+        return tpl.render(**ctx)
 
-def titles_for(ids):
-    skills = load_skill_graph()["skills"]
+def titles_for(ids, domain: Optional[str] = None):
+    skills = load_domain(domain).skill_graph["skills"]
     return {i: skills[i]["title"] for i in ids if i in skills}
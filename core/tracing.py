@@ -0,0 +1,305 @@
+# core/tracing.py
+"""
+Lightweight request tracing.
+
+span() opens a timed span under the current one; the current span lives in a
+contextvar, so it follows run_in_threadpool and asyncio tasks. Whether a trace
+is recorded is decided once, at its root span: TRACE_SAMPLE_RATE, or the
+sampled flag of an incoming W3C `traceparent` header. Unsampled traces get a
+shared no-op span, so instrumented code costs one contextvar lookup.
+
+Finished spans go to a bounded queue (overflow is dropped and counted) and a
+background thread appends them to TRACE_FILE in batches, either one flat JSON
+object per span (TRACE_FORMAT=jsonl) or one OTLP/JSON ExportTraceServiceRequest
+per batch (TRACE_FORMAT=otlp).
+"""
+import atexit
+import functools
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from core.settings import (
+    TRACE_SAMPLE_RATE,
+    TRACE_FILE,
+    TRACE_FORMAT,
+    TRACE_BATCH_SIZE,
+    TRACE_FLUSH_MS,
+    TRACE_MAX_QUEUE,
+)
+
+SERVICE_NAME = "xai-tutor-poc"
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attrs", "error")
+    sampled = True
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: str, attrs: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def incr(self, key: str, n: int = 1):
+        self.attrs[key] = self.attrs.get(key, 0) + n
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+class _NoopSpan:
+    """Stands in for every span of an unsampled trace."""
+    __slots__ = ()
+    sampled = False
+    trace_id = span_id = None
+
+    def set(self, **attrs):
+        pass
+
+    def incr(self, key: str, n: int = 1):
+        pass
+
+    def traceparent(self) -> Optional[str]:
+        return None
+
+NOOP = _NoopSpan()
+_current: ContextVar[Optional[Any]] = ContextVar("trace_span", default=None)
+
+def current_span():
+    """The innermost open span, or the no-op span outside a sampled trace."""
+    return _current.get() or NOOP
+
+def _root(traceparent: Optional[str]):
+    """(trace_id, parent_id) for a new trace, or None when it is not sampled."""
+    if traceparent:
+        m = _TRACEPARENT.match(traceparent.strip().lower())
+        if m:
+            if not int(m.group(3), 16) & 1:
+                return None
+            return m.group(1), m.group(2)
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return None
+    return os.urandom(16).hex(), None
+
+@contextmanager
+def span(name: str, *, kind: str = "internal", traceparent: Optional[str] = None, **attrs):
+    """Time a block as a child of the current span (or as a new, possibly sampled, root)."""
+    parent = _current.get()
+    if parent is NOOP:
+        yield NOOP
+        return
+    if parent is None:
+        root = _root(traceparent)
+        if root is None:
+            token = _current.set(NOOP)
+            try:
+                yield NOOP
+            finally:
+                _current.reset(token)
+            return
+        s = Span(name, root[0], root[1], kind, attrs)
+    else:
+        s = Span(name, parent.trace_id, parent.span_id, kind, attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current.reset(token)
+        _exporter.export(s)
+
+def traced(name: Optional[str] = None):
+    """Decorator form of span(); use current_span().set(...) inside for attributes."""
+    def deco(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+# -------- Export --------
+def _as_json(s: Span) -> dict:
+    return {
+        "trace_id": s.trace_id,
+        "span_id": s.span_id,
+        "parent_id": s.parent_id,
+        "name": s.name,
+        "kind": s.kind,
+        "start_unix_nano": s.start_ns,
+        "duration_ms": round((s.end_ns - s.start_ns) / 1e6, 3),
+        "attrs": s.attrs,
+        "error": s.error,
+    }
+
+def _otlp_value(v: Any) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+_OTLP_KIND = {"internal": 1, "server": 2, "client": 3}
+
+def _as_otlp(batch: List[Span]) -> dict:
+    spans = []
+    for s in batch:
+        o = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": _OTLP_KIND.get(s.kind, 1),
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attrs.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 0},
+        }
+        if s.parent_id:
+            o["parentSpanId"] = s.parent_id
+        spans.append(o)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "core.tracing"}, "spans": spans}],
+    }]}
+
+class SpanExporter:
+    """Batches finished spans onto a file from a background thread (started on first span)."""
+
+    def __init__(self, path: str, fmt: str = "jsonl", batch_size: int = 256,
+                 flush_ms: float = 1000, max_queue: int = 10000):
+        if fmt not in ("jsonl", "otlp"):
+            raise ValueError(f"unknown trace format {fmt!r}")
+        self.path = Path(path)
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.flush_s = max(0.0, flush_ms) / 1000.0
+        self.max_queue = max_queue
+        self._q: deque = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.exported = self.dropped = 0
+
+    def export(self, s: Span):
+        with self._cond:
+            if len(self._q) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._q.append(s)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+            if len(self._q) >= self.batch_size:
+                self._cond.notify()
+
+    def _take(self) -> List[Span]:
+        n = min(len(self._q), self.batch_size)
+        return [self._q.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._q) >= self.batch_size or self._stopping, self.flush_s)
+                batch = self._take()
+                stopping = self._stopping and not self._q
+            if batch:
+                self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch: List[Span]):
+        if self.fmt == "otlp":
+            lines = [json.dumps(_as_otlp(batch), default=str)]
+        else:
+            lines = [json.dumps(_as_json(s), default=str) for s in batch]
+        with self._write_lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        with self._cond:
+            self.exported += len(batch)
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        while True:
+            with self._cond:
+                batch = self._take()
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            t = self._thread
+        if t is not None:
+            t.join()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"queued": len(self._q), "exported": self.exported, "dropped": self.dropped}
+
+_exporter = SpanExporter(TRACE_FILE, TRACE_FORMAT, TRACE_BATCH_SIZE, TRACE_FLUSH_MS, TRACE_MAX_QUEUE)
+atexit.register(_exporter.close)
+
+def set_exporter(exporter: SpanExporter) -> SpanExporter:
+    """Swap the process-wide exporter (returns the previous one)."""
+    global _exporter
+    old, _exporter = _exporter, exporter
+    return old
+
+def flush():
+    _exporter.flush()
+
+def tracing_stats() -> dict:
+    return {"sample_rate": TRACE_SAMPLE_RATE, "format": _exporter.fmt, **_exporter.stats()}
+
+# -------- ASGI middleware --------
+class TracingMiddleware:
+    """Root span per HTTP request; echoes `traceparent` on sampled responses."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        tp = dict(scope.get("headers") or ()).get(b"traceparent")
+        with span(f"{scope['method']} {scope['path']}", kind="server",
+                  traceparent=tp.decode("latin-1") if tp else None,
+                  method=scope["method"], path=scope["path"]) as s:
+
+            async def _send(message):
+                if message["type"] == "http.response.start" and s.sampled:
+                    s.set(status_code=message["status"])
+                    message = {**message, "headers": [*message.get("headers", ()),
+                                                      (b"traceparent", s.traceparent().encode("latin-1"))]}
+                await send(message)
+
+            await self.app(scope, receive, _send)
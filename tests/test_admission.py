@@ -0,0 +1,51 @@
+# tests/test_admission.py
+import threading
+import time
+
+from core.admission import AdmissionController, PRIORITY_PRIMER, PRIORITY_CONTENT
+
+def test_sheds_when_budget_cannot_be_met():
+    ac = AdmissionController(max_concurrency=1, max_queue=4, rate_per_s=0, burst=1,
+                             initial_latency_s=1.0)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(_remaining):
+        started.set()
+        release.wait(2)
+        return "upstream"
+
+    t = threading.Thread(target=lambda: ac.run(slow, priority=PRIORITY_PRIMER, budget_s=5, fallback=lambda: "fb"))
+    t.start()
+    started.wait(2)
+    # one call in flight taking ~1s, so a 0.1s budget is shed without waiting
+    t0 = time.monotonic()
+    out = ac.run(lambda _r: "upstream", priority=PRIORITY_CONTENT, budget_s=0.1, fallback=lambda: "fb")
+    assert out == "fb"
+    assert time.monotonic() - t0 < 0.05
+    release.set()
+    t.join()
+
+    stats = ac.stats()
+    assert stats["shed"] == 1
+    assert stats["admitted"] == 1
+    assert stats["queue_depth"] == 0
+
+def test_admits_within_budget():
+    ac = AdmissionController(max_concurrency=2, max_queue=4, rate_per_s=100, burst=5)
+    assert ac.run(lambda r: r > 0, priority=PRIORITY_CONTENT, budget_s=5, fallback=lambda: None) is True
+
+def test_each_gemini_attempt_is_bounded_by_the_remaining_budget(monkeypatch):
+    from types import SimpleNamespace
+    from core import llm_gemini
+    seen = []
+
+    def fake(client, prompt, config):
+        seen.append(config.http_options.timeout)
+        cand = SimpleNamespace(finish_reason=SimpleNamespace(name="STOP"))
+        return SimpleNamespace(candidates=[cand], text="ok")
+
+    monkeypatch.setattr(llm_gemini, "_generate_content", fake)
+    monkeypatch.setattr(llm_gemini, "_get_client", lambda: None)
+    assert llm_gemini._generate_one("hi", timeout_s=2.0) == ("ok", True)
+    assert 0 < seen[0] <= 2000
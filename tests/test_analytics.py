@@ -0,0 +1,66 @@
+# tests/test_analytics.py
+from fastapi.testclient import TestClient
+from app import app
+from core import analytics, db as dbmod
+from core.state import get_state, update_score, reset_state
+
+client = TestClient(app)
+
+def _skill(report, sid):
+    return report["skills"][sid]
+
+def test_update_score_and_reset_move_readiness_buckets():
+    sid, skill = "analytics-t1", "prereq.math.basics"
+    before = analytics.mastery_report()
+    st = get_state(sid)
+    update_score(st, skill, True, 3)
+    update_score(st, skill, True, 3)
+    update_score(st, skill, False, 3)
+
+    r = client.get("/analytics/mastery").json()
+    assert r["sessions"] == before["sessions"] + 1
+    assert _skill(r, skill)["attempts"] == _skill(before, skill)["attempts"] + 3
+    assert _skill(r, skill)["correct"] == _skill(before, skill)["correct"] + 2
+    assert _skill(r, skill)["readiness"]["ready"] == _skill(before, skill)["readiness"]["ready"] + 1
+
+    reset_state(sid)
+    after = analytics.mastery_report()
+    assert after["sessions"] == before["sessions"]
+    assert _skill(after, skill)["readiness"] == _skill(before, skill)["readiness"]
+
+def test_backfill_seeds_from_learner_state(tmp_path, monkeypatch):
+    dbmod.close()
+    monkeypatch.setattr(dbmod, "DB_PATH", str(tmp_path / "a.db"))
+    monkeypatch.setattr(analytics, "LOG_FILE", tmp_path / "none.jsonl")
+    dbmod.init_db()
+    dbmod.save_state("a", "prereq.math.basics", False, {"prereq.math.basics": {"correct": 2, "total": 3}},
+                     {"prereq.math.basics": 3})
+    dbmod.save_state("b", "prereq.math.basics", False, {"prereq.math.basics": {"correct": 0, "total": 3}},
+                     {"prereq.math.basics": 1})
+    saved = dict(analytics._counters)
+    try:
+        r = analytics.backfill()
+        assert r["sessions"] == 2
+        s = _skill(r, "prereq.math.basics")
+        assert s["attempts"] == 4 and s["correct"] == 2
+        assert s["readiness"] == {"0": 1, "1": 0, "ready": 1}
+        assert ("sessions", "", 2) in dbmod.load_counters()
+    finally:
+        analytics._counters.clear()
+        analytics._counters.update(saved)
+        dbmod.close()
+
+def test_sqlite_report_includes_other_workers_changes(tmp_path, monkeypatch):
+    dbmod.close()
+    monkeypatch.setattr(dbmod, "DB_PATH", str(tmp_path / "m.db"))
+    monkeypatch.setattr(analytics, "USE_SQLITE", True)
+    dbmod.init_db()
+    try:
+        # another worker's increments land in mastery_agg only
+        dbmod.bump_counters([(analytics.SESSIONS, "", 3), (analytics.ATTEMPTS, "prereq.math.basics", 5)])
+        dbmod.flush(timeout=5)
+        r = analytics.mastery_report()
+        assert r["sessions"] == 3
+        assert _skill(r, "prereq.math.basics")["attempts"] == 5
+    finally:
+        dbmod.close()
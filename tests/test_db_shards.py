@@ -0,0 +1,57 @@
+# tests/test_db_shards.py
+from pathlib import Path
+
+from core import db as dbmod
+
+def _use_shards(tmp_path, monkeypatch, n):
+    dbmod.close()
+    monkeypatch.setattr(dbmod, "DB_PATH", str(tmp_path / "s.db"))
+    monkeypatch.setattr(dbmod, "DB_SHARDS", n)
+    dbmod.init_db()
+
+def test_rows_are_routed_and_scanned_across_shards(tmp_path, monkeypatch):
+    _use_shards(tmp_path, monkeypatch, 4)
+    for i in range(100):
+        dbmod.save_state(f"s{i}", "prereq.math.basics", False, {}, {})
+    dbmod.flush()
+    assert all(Path(p).exists() for p in dbmod.shard_paths(4))
+    assert dbmod.load_state("s42")[0] == "s42"
+    assert sorted(r[0] for r in dbmod.iter_states(chunk=7)) == sorted(f"s{i}" for i in range(100))
+    dbmod.close()
+
+def test_reshard_moves_every_row(tmp_path, monkeypatch):
+    _use_shards(tmp_path, monkeypatch, 1)
+    for i in range(50):
+        dbmod.save_state(f"s{i}", "prereq.math.basics", i % 2 == 0, {}, {})
+    dbmod.close()
+
+    assert dbmod.reshard(1, 3, chunk=8) == 50
+    _use_shards(tmp_path, monkeypatch, 3)
+    assert len(list(dbmod.iter_states())) == 50
+    assert dbmod.load_state("s4")[1] == 1
+    dbmod.close()
+
+    assert dbmod.reshard(3, 1) == 50
+    assert not Path(dbmod.shard_paths(3)[0]).exists()
+    _use_shards(tmp_path, monkeypatch, 1)
+    assert len(list(dbmod.iter_states())) == 50
+    dbmod.close()
+
+def test_init_refuses_to_shard_over_unmigrated_rows(tmp_path, monkeypatch):
+    _use_shards(tmp_path, monkeypatch, 1)
+    dbmod.save_state("s1", "prereq.math.basics", False, {}, {})
+    dbmod.close()
+
+    monkeypatch.setattr(dbmod, "DB_SHARDS", 4)
+    try:
+        dbmod.init_db()
+    except RuntimeError as e:
+        assert "python -m core.db reshard --from 1 --to 4" in str(e)
+    else:
+        raise AssertionError("expected RuntimeError")
+    dbmod.close()
+
+    dbmod.reshard(1, 4)
+    dbmod.init_db()
+    assert dbmod.load_state("s1")[0] == "s1"
+    dbmod.close()
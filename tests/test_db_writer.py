@@ -0,0 +1,32 @@
+# tests/test_db_writer.py
+from core import db as dbmod
+
+def _use_tmp_db(tmp_path, monkeypatch):
+    dbmod.close()
+    monkeypatch.setattr(dbmod, "DB_PATH", str(tmp_path / "t.db"))
+    dbmod.init_db()
+
+def test_group_commit_reads_own_writes_and_flushes(tmp_path, monkeypatch):
+    _use_tmp_db(tmp_path, monkeypatch)
+    futs = [dbmod.save_state(f"s{i}", "prereq.math.basics", False, {"a": {"correct": i, "total": 3}}, {})
+            for i in range(50)]
+    # visible before commit through the pending overlay
+    assert dbmod.load_state("s7")[3] == '{"a": {"correct": 7, "total": 3}}'
+    for f in futs:
+        f.result(timeout=5)
+    dbmod.delete_state("s3")
+    dbmod.flush(timeout=5)
+    assert dbmod.load_state("s3") is None
+    assert dbmod.load_state("s49")[0] == "s49"
+    dbmod.close()
+
+def test_failed_write_is_logged(tmp_path, monkeypatch, caplog):
+    import pytest
+    _use_tmp_db(tmp_path, monkeypatch)
+    writer = dbmod._shard_for("bad").writer()
+    with caplog.at_level("ERROR", logger="core.db"):
+        fut = writer.submit("bad", "INSERT INTO no_such_table VALUES (?)", (1,))
+        with pytest.raises(Exception):
+            fut.result(timeout=5)
+    assert any("write failed for bad" in r.getMessage() for r in caplog.records)
+    dbmod.close()
@@ -0,0 +1,39 @@
+# tests/test_decision_cache.py
+from core import orchestrator
+from core.decision_cache import DecisionCache, fingerprint
+from core.policy import SkillScore
+from core.state import reset_state
+
+PREREQS = {"b": ["a"], "a": []}
+
+def test_fingerprint_only_sees_node_and_its_prerequisites():
+    base = {"a": SkillScore(1, 3), "b": SkillScore(0, 0)}
+    other = {**base, "zzz": SkillScore(3, 3)}       # unrelated skill
+    assert fingerprint("CONTINUE", "b", base, PREREQS, 0, False) == \
+        fingerprint("CONTINUE", "b", other, PREREQS, 0, False)
+    moved = {**base, "a": SkillScore(2, 3)}
+    assert fingerprint("CONTINUE", "b", base, PREREQS, 0, False) != \
+        fingerprint("CONTINUE", "b", moved, PREREQS, 0, False)
+
+def test_lru_and_version_invalidation():
+    c = DecisionCache(max_entries=2)
+    c.put("dsa", "v1", 1, "one")
+    c.put("dsa", "v1", 2, "two")
+    c.get("dsa", "v1", 1)
+    c.put("dsa", "v1", 3, "three")                  # evicts 2, the least recently used
+    assert c.get("dsa", "v1", 2) is None and c.get("dsa", "v1", 1) == "one"
+    assert c.get("dsa", "v2", 1) is None            # new content version drops the domain
+    assert c.stats()["invalidations"] == 2
+
+def test_repeated_configuration_skips_policy(monkeypatch):
+    monkeypatch.setattr(orchestrator, "_decisions", DecisionCache(100))
+    calls = []
+    real = orchestrator.decide_next
+    monkeypatch.setattr(orchestrator, "decide_next", lambda **kw: calls.append(1) or real(**kw))
+    first = orchestrator.handle_event("dc-1", None, "start")
+    second = orchestrator.handle_event("dc-2", None, "start")
+    assert len(calls) == 1
+    assert first["ui"]["rationale"] == second["ui"]["rationale"]
+    assert orchestrator.decision_cache_stats()["hits"] == 1
+    reset_state("dc-1")
+    reset_state("dc-2")
@@ -0,0 +1,142 @@
+# tests/test_domains.py
+import shutil
+
+import yaml
+
+from fastapi.testclient import TestClient
+from app import app
+from core import loaders
+from core.loaders import DomainRegistry, UnknownDomain
+from core.state import get_state, reset_state, state_key
+
+client = TestClient(app)
+
+SKILLS = """skills:
+  - id: alg.basics
+    title: Algebra Basics
+  - id: alg.linear
+    title: Linear Equations
+    prerequisites: [alg.basics]
+"""
+QUESTIONS = """questions:
+  - id: a1
+    skill: alg.basics
+    prompt: "2 + 2 = ?"
+    answer: "4"
+"""
+
+def _add_domain(monkeypatch, tmp_path):
+    for d in ("dsa", "algebra"):
+        (tmp_path / d).mkdir()
+    for f in loaders._FILES:
+        shutil.copy(loaders.DATA_DIR / "dsa" / f, tmp_path / "dsa" / f)
+    (tmp_path / "algebra" / "skill_graph.yaml").write_text(SKILLS)
+    (tmp_path / "algebra" / "questions.yaml").write_text(QUESTIONS)
+    templates = yaml.safe_load((loaders.DATA_DIR / "dsa" / "explanations.yaml").read_text())["templates"]
+    (tmp_path / "algebra" / "explanations.yaml").write_text(yaml.safe_dump({"templates": templates}))
+    monkeypatch.setattr(loaders, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(loaders, "registry", DomainRegistry(1 << 30))
+
+def test_second_domain_loads_lazily_and_drives_session(monkeypatch, tmp_path):
+    _add_domain(monkeypatch, tmp_path)
+    assert loaders.available_domains() == ["algebra", "dsa"]
+    assert loaders.registry.stats()["loaded"] == []
+
+    r = client.post("/session/ingest", json={"session_id": "dom-1", "action": "start", "domain": "algebra"})
+    assert r.status_code == 200
+    assert loaders.registry.stats()["loaded"] == ["algebra"]
+    assert get_state(state_key("dom-1", "algebra")).current_node == "alg.basics"
+
+    r = client.post("/session/ingest", json={"session_id": "dom-1", "action": "answer",
+                                             "question_id": "a1", "answer": " 4 ", "domain": "algebra"})
+    assert r.json()["graded"] == {"correct": True, "skill": "alg.basics", "expected": "4"}
+    reset_state(state_key("dom-1", "algebra"))
+
+def test_state_is_kept_per_domain(monkeypatch, tmp_path):
+    from core import orchestrator
+    _add_domain(monkeypatch, tmp_path)
+    dsa = get_state("dom-5")
+    dsa.current_node = "core.bigO.time"
+    dsa.pending_index_per_node["alg.basics"] = 0
+
+    orchestrator.handle_event("dom-5", None, "start", "algebra")
+    orchestrator.grade_answer("dom-5", "a1", "4", "algebra")
+    assert get_state("dom-5").current_node == "core.bigO.time"
+    assert "alg.basics" not in get_state("dom-5").scores
+    alg = get_state(state_key("dom-5", "algebra"))
+    assert alg.current_node == "alg.basics" and "alg.basics" in alg.scores
+    for key in ("dom-5", state_key("dom-5", "algebra")):
+        reset_state(key)
+
+def test_registry_evicts_least_recently_used(monkeypatch, tmp_path):
+    _add_domain(monkeypatch, tmp_path)
+    reg = DomainRegistry(max_bytes=1)   # room for the most recent bundle only
+    reg.get("dsa")
+    reg.get("algebra")
+    st = reg.stats()
+    assert st["loaded"] == ["algebra"] and st["evictions"] == 1
+
+def test_unknown_domain_is_404():
+    r = client.post("/session/ingest", json={"session_id": "dom-2", "action": "start", "domain": "nope"})
+    assert r.status_code == 404
+    assert r.json()["error"] == "unknown_domain"
+    r = client.post("/session/ingest", json={"session_id": "dom-2", "action": "start", "domain": "../data"})
+    assert r.status_code == 404
+    try:
+        loaders.load_domain("nope")
+    except UnknownDomain:
+        pass
+    else:
+        raise AssertionError("expected UnknownDomain")
+
+def test_primer_and_cache_scope_follow_the_domain(monkeypatch, tmp_path):
+    from core import orchestrator
+    _add_domain(monkeypatch, tmp_path)
+    calls = []
+    monkeypatch.setattr(orchestrator, "gemini_generate", lambda prompt, **kw: calls.append((prompt, kw)) or "md")
+
+    r = orchestrator.handle_event("dom-3", "Diagnostic: No", "continue", "algebra")
+    assert r["ui"]["options"] == ["Take Diagnostic Later"]
+    assert "algebra" in calls[-1][0] and "Big-O" not in calls[-1][0]
+    r = orchestrator.handle_event("dom-3", "Start with Big-O", "continue", "algebra")
+    assert r["next_node"] != "core.bigO.time"
+
+    r = orchestrator.handle_event("dom-4", "Diagnostic: No", "continue", "dsa")
+    assert r["ui"]["options"][:2] == ["Start with Big-O", "Review Algorithmic Vocabulary"]
+    assert orchestrator.handle_event("dom-4", "Start with Big-O", "continue", "dsa")["next_node"] == "core.bigO.time"
+
+    orchestrator.handle_event("dom-4", "what is big o", "content_only")
+    orchestrator.handle_event("dom-4", "what is big o", "content_only", "dsa")
+    assert calls[-1][1]["cache_scope"] == calls[-2][1]["cache_scope"]
+    for sid in ("dom-3", "dom-4"):
+        reset_state(sid)
+
+def test_content_only_fallback_follows_the_domain(monkeypatch, tmp_path):
+    from core import orchestrator, llm_gemini
+    _add_domain(monkeypatch, tmp_path)
+    monkeypatch.setattr(llm_gemini, "GEMINI_API_KEY", "")
+
+    r = orchestrator.handle_event("dom-6", "what is x", "content_only", "algebra")
+    content, _ = r["ui"]["content"]
+    assert "algebra" in content and "DSA" not in content
+    assert r["from_node"] == "alg.basics"
+    assert "DSA" in orchestrator.handle_event("dom-6", "what is big o", "content_only")["ui"]["content"][0]
+    for key in ("dom-6", state_key("dom-6", "algebra")):
+        reset_state(key)
+
+def test_memoized_values_count_toward_the_budget(monkeypatch, tmp_path):
+    from core.grading import answer_key
+    from core.templating import render
+    _add_domain(monkeypatch, tmp_path)
+    reg = loaders.registry
+    alg = reg.get("algebra")
+    dsa = reg.get("dsa")
+    before, size = reg.stats()["bytes"], dsa.size
+    answer_key("dsa")
+    render("advance", {}, "dsa")
+    assert dsa.size > size and reg.stats()["bytes"] - before == dsa.size - size
+
+    reg.max_bytes = reg.stats()["bytes"]    # the next memoized value overflows the budget
+    answer_key("algebra")
+    st = reg.stats()
+    assert st["loaded"] == ["algebra"] and st["evictions"] == 1 and st["bytes"] == alg.size
@@ -0,0 +1,48 @@
+# tests/test_export.py
+import json
+
+from fastapi.testclient import TestClient
+from app import app
+from core import db as dbmod
+from core.export import to_csv, learner_state_columns
+from core.state import get_state, update_score, reset_state
+
+client = TestClient(app)
+
+def test_export_learner_state_ndjson_by_prefix():
+    st = get_state("exp-a")
+    update_score(st, "prereq.math.basics", True, 3)
+    get_state("other-b")
+    r = client.get("/export/learner_state", params={"prefix": "exp-"})
+    assert r.status_code == 200
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["session_id"] for row in rows] == ["exp-a"]
+    assert rows[0]["score.prereq.math.basics.correct"] == 1
+    reset_state("exp-a")
+    reset_state("other-b")
+
+def test_export_time_filter_needs_sqlite_in_memory_mode():
+    r = client.get("/export/learner_state", params={"since": "2026-01-01"})
+    assert r.status_code == 400
+
+def test_iter_states_pages_and_filters(tmp_path, monkeypatch):
+    dbmod.close()
+    monkeypatch.setattr(dbmod, "DB_PATH", str(tmp_path / "e.db"))
+    dbmod.init_db()
+    for i in range(25):
+        dbmod.save_state(f"s{i:02d}", "prereq.math.basics", False, {}, {})
+    dbmod.save_state("t1", "prereq.math.basics", False, {}, {})
+    dbmod.flush()
+    rows = list(dbmod.iter_states(chunk=4, prefix="s"))
+    assert [r[0] for r in rows] == [f"s{i:02d}" for i in range(25)]
+    assert list(dbmod.iter_states(since="2999-01-01")) == []
+    dbmod.close()
+
+def test_csv_flattens_with_fixed_columns():
+    rows = [{"session_id": "x", "current_node": "n", "skipped_diagnostic": False, "updated_at": None,
+             "score.prereq.math.basics.correct": 2}]
+    text = "".join(to_csv(rows, learner_state_columns()))
+    header, line = text.splitlines()
+    assert header.split(",")[0] == "session_id"
+    assert "score.prereq.math.basics.correct" in header
+    assert line.startswith("x,n,False,,2,")
@@ -0,0 +1,48 @@
+# tests/test_frontier.py
+from core.policy import decide_next, Frontier, SkillScore
+
+PREREQS = {"prereq.math.basics": [],
+           "prereq.algorithms.vocab": ["prereq.math.basics"],
+           "core.bigO.time": ["prereq.algorithms.vocab"]}
+DEPENDENTS = {"prereq.math.basics": ["prereq.algorithms.vocab"],
+              "prereq.algorithms.vocab": ["core.bigO.time"],
+              "core.bigO.time": []}
+
+def test_frontier_unlocks_dependents_incrementally():
+    scores = {"prereq.math.basics": SkillScore(correct=1, total=3)}
+    f = Frontier(scores, PREREQS, DEPENDENTS)
+    assert f.is_unlocked("prereq.math.basics")
+    assert not f.is_unlocked("prereq.algorithms.vocab")
+    assert f.unmet("prereq.algorithms.vocab") == ["prereq.math.basics"]
+
+    scores["prereq.math.basics"].correct = 2
+    f.on_score_change(scores, "prereq.math.basics")
+    assert f.is_ready("prereq.math.basics")
+    assert f.is_unlocked("prereq.algorithms.vocab")
+    assert not f.is_unlocked("core.bigO.time")
+
+def test_decide_next_same_with_and_without_frontier():
+    scores = {"prereq.math.basics": SkillScore(correct=2, total=3),
+              "prereq.algorithms.vocab": SkillScore(correct=1, total=3)}
+    kwargs = dict(intent="CONTINUE", current_node="core.bigO.time", scores=scores,
+                  prerequisites=PREREQS, pending_items_in_node=0)
+    plain = decide_next(**kwargs)
+    fast = decide_next(**kwargs, frontier=Frontier(scores, PREREQS, DEPENDENTS))
+    assert plain == fast
+    assert fast.action == "REVIEW_PREREQ"
+    assert fast.next_node == "prereq.algorithms.vocab"
+
+def test_frontier_only_built_for_long_lived_states_in_sqlite_mode(tmp_path, monkeypatch):
+    from core import db as dbmod, state as statemod
+    dbmod.close()
+    monkeypatch.setattr(dbmod, "DB_PATH", str(tmp_path / "f.db"))
+    monkeypatch.setattr(statemod, "USE_SQLITE", True)
+    dbmod.init_db()
+    try:
+        st = statemod.get_state("fr-1")            # loaded for this request only
+        assert statemod.frontier_for(st, session_id="fr-1") is None
+        held = statemod.hold("fr-1")
+        assert statemod.frontier_for(held, session_id="fr-1") is not None
+        statemod.release("fr-1")
+    finally:
+        dbmod.close()
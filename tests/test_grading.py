@@ -0,0 +1,51 @@
+# tests/test_grading.py
+from fastapi.testclient import TestClient
+from app import app
+from core.state import get_state, reset_state
+
+client = TestClient(app)
+
+CSV = """session_id,question_id,answer
+bulk-1,q1,>
+bulk-1,q2, 4
+bulk-1,q3,0
+bulk-2,q1,<
+bulk-2,nope,x
+"""
+
+def test_bulk_grade_csv_updates_scores_and_summaries():
+    r = client.post("/grade/bulk", params={"format": "csv"}, content=CSV)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["answers"] == 5
+    assert body["correct"] == 2
+    assert body["unknown_questions"] == 1
+    s1 = body["sessions"]["bulk-1"]
+    assert s1["by_skill"]["prereq.math.basics"] == {"answered": 3, "correct": 2}
+    assert body["sessions"]["bulk-2"]["unknown_questions"] == 1
+
+    sc = get_state("bulk-1").scores["prereq.math.basics"]
+    assert (sc.correct, sc.total) == (2, 3)
+    reset_state("bulk-1")
+    reset_state("bulk-2")
+
+def test_bulk_grade_rejects_bad_header():
+    r = client.post("/grade/bulk", params={"format": "csv"}, content="sid,qid,ans\na,q1,>\n")
+    assert r.status_code == 400
+
+def test_bulk_grade_jsonl():
+    body = '{"session_id": "bulk-3", "question_id": "q4", "answer": "Size/length of the data"}\n'
+    r = client.post("/grade/bulk", params={"format": "jsonl"}, content=body)
+    assert r.json()["correct"] == 1
+    reset_state("bulk-3")
+
+def test_bad_line_late_in_upload_changes_nothing():
+    good = "".join(f'{{"session_id": "bulk-4", "question_id": "q1", "answer": ">"}}\n' for _ in range(5))
+    r = client.post("/grade/bulk", params={"format": "jsonl"}, content=good + "bad\n")
+    assert r.status_code == 400 and "line 6" in r.json()["detail"]
+    r = client.post("/grade/bulk", params={"format": "csv"}, content=CSV + "short\n")
+    assert r.status_code == 400 and "line 7" in r.json()["detail"]
+    assert "prereq.math.basics" not in get_state("bulk-4").scores
+    assert "prereq.math.basics" not in get_state("bulk-1").scores
+    reset_state("bulk-1")
+    reset_state("bulk-4")
@@ -0,0 +1,66 @@
+# tests/test_llm_batch.py
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.llm_batch import MicroBatcher, HttpBatchBackend
+
+class _FakeLLM(BaseHTTPRequestHandler):
+    batch_sizes: list = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompts = body["prompts"]
+        self.batch_sizes.append(len(prompts))
+        out = json.dumps({"outputs": [f"echo: {p}" for p in prompts]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+def test_concurrent_prompts_are_batched_and_fanned_out():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeLLM)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _FakeLLM.batch_sizes = []
+    batcher = MicroBatcher(HttpBatchBackend(f"http://127.0.0.1:{server.server_port}/"),
+                           window_ms=50, max_batch=8)
+    try:
+        prompts = [f"p{i}" for i in range(20)]
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            results = list(pool.map(lambda p: batcher.submit(p).result(timeout=5), prompts))
+    finally:
+        batcher.close()
+        server.shutdown()
+
+    assert results == [f"echo: {p}" for p in prompts]
+    assert sum(_FakeLLM.batch_sizes) == 20
+    assert max(_FakeLLM.batch_sizes) <= 8
+    assert len(_FakeLLM.batch_sizes) < 20          # requests were actually grouped
+
+def test_per_item_errors_only_fail_their_caller():
+    batcher = MicroBatcher(lambda ps, t: [ValueError(p) if p == "bad" else p.upper() for p in ps], window_ms=20)
+    good, bad = batcher.submit("ok"), batcher.submit("bad")
+    assert good.result(timeout=2) == "OK"
+    assert isinstance(bad.exception(timeout=2), ValueError)
+    batcher.close()
+
+def test_expired_and_cancelled_items_are_not_dispatched():
+    sent, timeouts = [], []
+    batcher = MicroBatcher(lambda ps, t: sent.extend(ps) or timeouts.append(t) or ps, window_ms=50)
+    now = time.monotonic()
+    expired = batcher.submit("late", deadline=now - 1)
+    dropped = batcher.submit("gone", deadline=now + 5)
+    dropped.cancel()
+    ok = batcher.submit("ok", deadline=now + 5)
+    assert ok.result(timeout=2) == "ok"
+    assert isinstance(expired.exception(timeout=2), TimeoutError)
+    batcher.close()
+    assert sent == ["ok"]
+    assert 0 < timeouts[0] <= 5              # backend call bounded by the caller's budget
+    assert batcher.stats()["expired"] == 2
@@ -0,0 +1,35 @@
+# tests/test_prompt_cache.py
+from core.prompt_cache import PromptCache
+
+def test_near_duplicates_hit_within_scope():
+    c = PromptCache(threshold=0.5)
+    c.put("core.bigO.time", "Explain Big-O notation", "answer")
+    assert c.get("core.bigO.time", "explain big o") == "answer"
+    assert c.get("core.bigO.time", "what is big O?") == "answer"
+    assert c.get("core.bigO.time", "explain big data") is None
+    assert c.get("prereq.math.basics", "explain big o") is None
+
+def test_lru_eviction_bounds_size():
+    c = PromptCache(max_entries=2)
+    c.put("n", "binary search", "1")
+    c.put("n", "merge sort", "2")
+    c.get("n", "binary search")          # refresh
+    c.put("n", "hash tables", "3")
+    assert c.get("n", "merge sort") is None
+    assert c.get("n", "binary search") == "1"
+    assert c.stats()["size"] == 2
+
+def test_negations_and_comparatives_never_match():
+    c = PromptCache()
+    c.put("n", "when should I use recursion", "use")
+    assert c.get("n", "when should I not use recursion") is None
+    assert c.get("n", "when shouldn't I use recursion") is None
+    assert c.get("n", "when should i use recursion?") == "use"
+    c.put("n", "why is binary search faster than linear search", "faster")
+    assert c.get("n", "is binary search slower than linear search") is None
+    assert c.get("n", "why is binary search faster than a linear search") == "faster"
+
+def test_default_threshold_rejects_loose_overlap():
+    c = PromptCache()
+    c.put("n", "explain merge sort complexity", "a")
+    assert c.get("n", "explain merge sort stability") is None
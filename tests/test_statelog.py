@@ -0,0 +1,78 @@
+# tests/test_statelog.py
+from core.statelog import StateLog
+
+def _d(node, correct):
+    return {"current_node": node, "skipped_diagnostic": False,
+            "scores": {node: {"correct": correct, "total": 3}}, "pending": {node: correct}}
+
+def test_recover_from_snapshot_plus_log_tail(tmp_path):
+    log = StateLog(str(tmp_path), snapshot_min_ops=3)
+    log.recover()
+    log.start()
+    log.record_save("a", _d("prereq.math.basics", 1))
+    log.record_save("b", _d("prereq.math.basics", 2))
+    log.record_save("c", _d("core.bigO.time", 0))      # 3rd op triggers a snapshot
+    log.flush()
+    log.record_save("a", _d("prereq.math.basics", 2))  # tail after the snapshot
+    log.record_delete("c")
+    log.close()
+    assert list(tmp_path.glob("snapshot-*.bin"))
+
+    restored = StateLog(str(tmp_path)).recover()
+    assert set(restored) == {"a", "b"}
+    assert restored["a"][2]["prereq.math.basics"] == (2, 3)
+    assert restored["b"] == ("prereq.math.basics", False, {"prereq.math.basics": (2, 3)},
+                             {"prereq.math.basics": 2})
+
+def test_torn_tail_line_is_ignored(tmp_path):
+    log = StateLog(str(tmp_path))
+    log.recover()
+    log.start()
+    log.record_save("a", _d("prereq.math.basics", 1))
+    log.close()
+    seg = sorted(tmp_path.glob("log-*.jsonl"))[-1]
+    with open(seg, "a", encoding="utf-8") as f:
+        f.write('{"s": 2, "op": "put", "id": "b", "d": {"curr')
+    assert set(StateLog(str(tmp_path)).recover()) == {"a"}
+
+def test_enable_state_log_rebuilds_analytics(tmp_path, monkeypatch):
+    from collections import Counter
+    from core import analytics, state as statemod
+    log = StateLog(str(tmp_path))
+    log.recover()
+    log.start()
+    log.record_save("a", _d("prereq.math.basics", 2))
+    log.close()
+
+    monkeypatch.setattr(statemod, "_STORE", {})
+    monkeypatch.setattr(statemod, "_LOG", None)
+    monkeypatch.setattr(analytics, "_counters", Counter())
+    monkeypatch.setattr(analytics, "LOG_FILE", tmp_path / "no-audit.jsonl")
+    restored = StateLog(str(tmp_path))
+    statemod.enable_state_log(restored)
+    try:
+        report = analytics.mastery_report()
+        assert report["sessions"] == 1
+        assert report["skills"]["prereq.math.basics"]["readiness"]["ready"] == 1
+        statemod.reset_state("a")
+        report = analytics.mastery_report()
+        assert report["sessions"] == 0
+        assert report["skills"]["prereq.math.basics"]["readiness"]["ready"] == 0
+    finally:
+        restored.close()
+
+def test_ops_after_restart_on_a_torn_segment_survive(tmp_path):
+    log = StateLog(str(tmp_path))
+    log.recover()
+    log.start()
+    log.close()
+    seg = sorted(tmp_path.glob("log-*.jsonl"))[-1]
+    seg.write_text('{"s": 1, "op": "put", "id": "x", "d": {"curr')   # crash during the first write
+
+    log = StateLog(str(tmp_path))
+    assert log.recover() == {}
+    log.start()
+    log.record_save("a", _d("prereq.math.basics", 1))
+    log.record_save("b", _d("prereq.math.basics", 2))
+    log.close()
+    assert set(StateLog(str(tmp_path)).recover()) == {"a", "b"}
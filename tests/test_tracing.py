@@ -0,0 +1,58 @@
+# tests/test_tracing.py
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from app import app
+from core import tracing
+from core.state import reset_state
+
+client = TestClient(app)
+
+@pytest.fixture
+def traces(monkeypatch, tmp_path):
+    """Record every trace into a fresh file; yields its path."""
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    old = tracing.set_exporter(tracing.SpanExporter(str(path), "jsonl", batch_size=1000, flush_ms=60000))
+    yield path
+    tracing.set_exporter(old)
+
+def _read(path):
+    tracing.flush()
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+def test_request_spans_share_one_trace(traces):
+    r = client.post("/session/ingest", json={"session_id": "tr-1", "action": "answer",
+                                             "question_id": "q1", "answer": ">"})
+    assert r.status_code == 200
+    spans = _read(traces)
+    reset_state("tr-1")
+
+    by_name = {s["name"]: s for s in spans}
+    root = by_name["POST /session/ingest"]
+    assert root["parent_id"] is None and root["attrs"]["status_code"] == 200
+    assert r.headers["traceparent"] == f"00-{root['trace_id']}-{root['span_id']}-01"
+    assert {"grade_answer", "handle_event", "render"} <= set(by_name)
+    assert all(s["trace_id"] == root["trace_id"] for s in spans)
+    assert by_name["grade_answer"]["parent_id"] == root["span_id"]
+    assert by_name["grade_answer"]["attrs"]["correct"] is True
+    assert by_name["render"]["parent_id"] == by_name["handle_event"]["span_id"]
+
+def test_sampling_off_and_unsampled_parent_record_nothing(traces, monkeypatch):
+    r = client.get("/health", headers={"traceparent": "00-" + "a" * 32 + "-" + "b" * 16 + "-00"})
+    assert "traceparent" not in r.headers
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    client.get("/health")
+    assert _read(traces) == []
+
+def test_otlp_batch_format(traces):
+    tracing.set_exporter(tracing.SpanExporter(str(traces), "otlp", batch_size=1000, flush_ms=60000))
+    with tracing.span("outer", kind="server", n=3):
+        with tracing.span("inner"):
+            tracing.current_span().incr("retries")
+    (batch,) = _read(traces)
+    spans = batch["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    inner, outer = spans
+    assert inner["parentSpanId"] == outer["spanId"] and outer["kind"] == 2
+    assert inner["attributes"] == [{"key": "retries", "value": {"intValue": "1"}}]
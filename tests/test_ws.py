@@ -0,0 +1,98 @@
+# tests/test_ws.py
+import time
+
+from fastapi.testclient import TestClient
+from api import routes
+from app import app
+from core import state as statemod
+from core.state import get_state, reset_state
+
+client = TestClient(app)
+
+class _CountingLog:
+    def __init__(self):
+        self.saves = 0
+
+    def record_save(self, session_id, d):
+        self.saves += 1
+
+    def record_delete(self, session_id):
+        pass
+
+def test_ws_holds_state_and_persists_on_disconnect(monkeypatch):
+    log = _CountingLog()
+    monkeypatch.setattr(statemod, "_LOG", log)
+    with client.websocket_connect("/session/ws?session_id=ws-1") as ws:
+        ws.send_json({"action": "start"})
+        first = ws.receive_json()
+        assert first["type"] == "response" and first["session_id"] == "ws-1"
+        ws.send_json({"action": "answer", "question_id": "q1", "answer": ">"})
+        r = ws.receive_json()
+        assert r["graded"]["correct"] is True
+        ws.send_json({"action": "answer", "question_id": "q2", "answer": "4"})
+        ws.receive_json()
+        assert log.saves == 0          # held: nothing written mid-connection
+    assert log.saves == 1              # one write on disconnect
+    assert get_state("ws-1").scores["prereq.math.basics"].correct == 2
+    assert "ws-1" not in statemod._HELD
+    reset_state("ws-1")
+
+def test_ws_flushes_after_debounce(monkeypatch):
+    log = _CountingLog()
+    monkeypatch.setattr(statemod, "_LOG", log)
+    monkeypatch.setattr(routes, "WS_PERSIST_DEBOUNCE_MS", 20)
+    with client.websocket_connect("/session/ws?session_id=ws-3") as ws:
+        ws.send_json({"action": "answer", "question_id": "q1", "answer": ">"})
+        ws.receive_json()
+        deadline = time.monotonic() + 2
+        while log.saves == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert log.saves == 1
+    assert log.saves == 1              # nothing left dirty at disconnect
+    reset_state("ws-3")
+
+def test_ws_reports_bad_frames_without_closing():
+    with client.websocket_connect("/session/ws?session_id=ws-2") as ws:
+        ws.send_text("not json")
+        assert ws.receive_json()["status"] == 400
+        ws.send_json({"action": "bogus"})
+        assert ws.receive_json()["status"] == 422
+        ws.send_json({"action": "answer"})
+        assert ws.receive_json() == {"type": "error", "status": 400, "detail": "question_id required when action=answer"}
+        ws.send_json({"action": "start", "domain": "nope"})
+        assert ws.receive_json()["status"] == 404
+        ws.send_json({"action": "start"})
+        assert ws.receive_json()["type"] == "response"
+    reset_state("ws-2")
+
+def test_bulk_grading_updates_held_session_in_sqlite_mode(tmp_path, monkeypatch):
+    from core import db as dbmod
+    from core.grading import grade_text
+    dbmod.close()
+    monkeypatch.setattr(dbmod, "DB_PATH", str(tmp_path / "w.db"))
+    monkeypatch.setattr(statemod, "USE_SQLITE", True)
+    dbmod.init_db()
+    try:
+        statemod.hold("w1")
+        grade_text("session_id,question_id,answer\nw1,q1,>\nw1,q2,4\n", "csv")
+        assert statemod.get_state("w1").scores["prereq.math.basics"].correct == 2
+        statemod.release("w1").result(timeout=5)
+        dbmod.flush(timeout=5)
+        assert '"correct": 2' in dbmod.load_state("w1")[3]
+    finally:
+        dbmod.close()
+
+def test_reset_while_connected_keeps_counters_balanced():
+    from core import analytics
+    before = analytics.mastery_report()
+    with client.websocket_connect("/session/ws?session_id=ws-4") as ws:
+        ws.send_json({"action": "answer", "question_id": "q1", "answer": ">"})
+        ws.receive_json()
+        assert client.post("/session/reset", params={"session_id": "ws-4"}).status_code == 200
+        ws.send_json({"action": "answer", "question_id": "q1", "answer": ">"})
+        ws.receive_json()
+    assert get_state("ws-4").scores["prereq.math.basics"].correct == 1
+    reset_state("ws-4")
+    after = analytics.mastery_report()
+    assert after["sessions"] == before["sessions"]
+    assert after["skills"]["prereq.math.basics"]["readiness"] == before["skills"]["prereq.math.basics"]["readiness"]